@@ -0,0 +1,96 @@
+"""
+Benchmark of the fragment plugin on rows of overlapping cells.
+
+The models are rows of unit boxes, each overlapping the next one in the
+row, with about 1k, 3k and 10k cells. The rows do not overlap each other,
+so they are fragmented separately with the cluster option. The cells are
+fragmented with each set of options and the time per cell and number of
+fragments are reported and compared to the stored baseline.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_fragment [--sizes 1000] [--options default use_obb] [--runs 3] [--update-baseline]
+"""
+import argparse
+import sys
+from math import ceil, sqrt
+
+import cadquery as cq
+
+import plugins.fragment.fragment  # noqa: F401, patches Solid._fragment
+from . import utils
+
+BENCHMARK_NAME = "fragment"
+SIZES = [1000, 3000, 10000]
+OPTIONS = {
+    "default": {},
+    "use_obb": {"use_obb": True},
+    "nondestructive": {"nondestructive": True},
+    "serial": {"parallel": False},
+    "cluster": {"cluster": True},
+}
+OVERLAP = 0.1
+
+
+def make_cells(size):
+    """
+    Returns `size` unit boxes in rows along X, each box overlapping
+    the next one in its row
+    """
+    side = ceil(sqrt(size))
+    cell = cq.Solid.makeBox(1 + OVERLAP, 1, 1)
+    return [
+        cell.moved(cq.Location(cq.Vector(i, 2 * j, 0)))
+        for j in range(side)
+        for i in range(side)
+    ][:size]
+
+
+def fragment(*cells, **options):
+    return cells[0]._fragment(*cells[1:], **options)
+
+
+def run(sizes, options, runs):
+    results = {}
+    for size in sizes:
+        for name in options:
+            # fresh cells for each run, fragment can modify its inputs
+            fragments, elapsed, _ = utils.measure(
+                fragment,
+                runs=runs,
+                memory=False,
+                setup=lambda: make_cells(size),
+                **OPTIONS[name]
+            )
+            key = "{}/{}".format(name, size)
+            results[key] = {
+                "cells": size,
+                "fragments": len(fragments.Solids()),
+                "seconds": elapsed,
+                "per_cell": elapsed / size,
+            }
+            print(
+                "{:<25} {:>8} cells {:>8} fragments {:>9.2f} ms/cell".format(
+                    key, size, len(fragments.Solids()), elapsed / size * 1e3
+                )
+            )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument(
+        "--options", nargs="+", choices=list(OPTIONS), default=list(OPTIONS)
+    )
+    utils.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.options, args.runs)
+    return utils.report(
+        BENCHMARK_NAME, results, args, "per_cell", unit_scale=1e3, unit="ms"
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
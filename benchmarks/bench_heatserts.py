@@ -0,0 +1,89 @@
+"""
+Benchmark of the heatserts plugin on plates with hundreds of inserts.
+
+The models are square plates with a grid of about 100, 500 and 1k M3
+heatsert holes with bolt clearance and a chamfer. The holes are cut with
+Workplane.cutEach, the default, and with the batched mode. The time per
+hole is reported and compared to the stored baseline.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_heatserts [--sizes 500] [--modes cutEach batched] [--runs 3] [--update-baseline]
+"""
+import argparse
+import sys
+from math import ceil, sqrt
+
+import cadquery as cq
+
+import plugins.heatserts.heatserts  # noqa: F401, patches Workplane.heatsert
+from . import utils
+
+BENCHMARK_NAME = "heatserts"
+SIZES = [100, 500, 1000]
+MODES = {
+    "cutEach": {},
+    "batched": {"batched": True},
+}
+PITCH = 10
+
+
+def make_plate(size):
+    """
+    Returns a plate with `size` points on its top face, on a square grid
+    """
+    side = ceil(sqrt(size))
+    return (
+        cq.Workplane()
+        .box(side * PITCH, side * PITCH, 10)
+        .faces(">Z")
+        .workplane()
+        .rarray(PITCH, PITCH, side, side)
+    )
+
+
+def run(sizes, modes, runs):
+    results = {}
+    for size in sizes:
+        plate = make_plate(size)
+        holes = plate.size()
+        for name in modes:
+            result, elapsed, _ = utils.measure(
+                plate.heatsert,
+                "M3",
+                runs=runs,
+                memory=False,
+                bolt_clear=8,
+                chamfer=0.5,
+                **MODES[name]
+            )
+            key = "{}/{}".format(name, size)
+            results[key] = {
+                "holes": holes,
+                "faces": result.faces().size(),
+                "seconds": elapsed,
+                "per_hole": elapsed / holes,
+            }
+            print(
+                "{:<25} {:>8} holes {:>8} faces {:>9.2f} ms/hole".format(
+                    key, holes, results[key]["faces"], elapsed / holes * 1e3
+                )
+            )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    utils.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.modes, args.runs)
+    return utils.report(
+        BENCHMARK_NAME, results, args, "per_hole", unit_scale=1e3, unit="ms"
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Benchmark of the import and first use time of the localselectors plugin.
+
+Each measurement is done in a fresh Python process, after cadquery itself
+has been imported, so only the cost of the plugin is measured: importing
+it, the first selection using global axes only, the first selection using
+a lowercase axis (which builds the grammars) and parsing a new expression.
+The median of several runs is reported and compared to the stored baseline.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_localselectors_import [--runs 10] [--update-baseline]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from . import utils
+
+BENCHMARK_NAME = "localselectors_import"
+RUNS = 10
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+import json
+import time
+import cadquery as cq
+
+timings = {}
+start = time.perf_counter()
+import plugins.localselectors.localselectors as localselectors
+timings["import"] = time.perf_counter() - start
+
+box = cq.Workplane().box(1, 1, 1)
+start = time.perf_counter()
+box.faces(">Z or %PLANE exc <X")
+timings["first_global_selection"] = time.perf_counter() - start
+
+start = time.perf_counter()
+box.faces(">z")
+timings["first_local_selection"] = time.perf_counter() - start
+
+start = time.perf_counter()
+localselectors._parse("not (>z[-2] or <x) and (|y exc #xy) or %PLANE and not >>z[1]")
+timings["parse"] = time.perf_counter() - start
+
+print(json.dumps(timings))
+"""
+
+
+def run_once():
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT],
+        check=True,
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def run(runs):
+    timings = [run_once() for _ in range(runs)]
+    results = {}
+    for key in timings[0]:
+        seconds = statistics.median(t[key] for t in timings)
+        results[key] = {"seconds": seconds}
+        print("{:<25} {:>9.2f} ms".format(key, seconds * 1e3))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    utils.add_arguments(parser, runs=RUNS)
+    args = parser.parse_args(argv)
+
+    results = run(args.runs)
+    return utils.report(
+        BENCHMARK_NAME, results, args, "seconds", unit_scale=1e3, unit="ms"
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
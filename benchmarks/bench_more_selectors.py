@@ -0,0 +1,125 @@
+"""
+Benchmark of the more_selectors plugin on large synthetic models.
+
+The models are grids of filleted bosses with about 1k, 10k and 100k
+faces or edges. Each selector class is timed and the time per object
+and the peak memory are reported and compared to the stored baseline.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_more_selectors [--sizes 1000 10000] [--runs 3] [--update-baseline]
+"""
+import argparse
+import sys
+from math import ceil, sqrt
+
+import cadquery as cq
+
+from plugins.more_selectors.more_selectors import (
+    InfiniteCylinderSelector,
+    InfHollowCylinderSelector,
+    CylinderSelector,
+    HollowCylinderSelector,
+    SphereSelector,
+    HollowSphereSelector,
+    OrientedBoxSelector,
+    SlabSelector,
+    ConeSelector,
+    UnionSelector,
+)
+from . import utils
+
+BENCHMARK_NAME = "more_selectors"
+SIZES = [1000, 10000, 100000]
+KINDS = ["faces", "edges"]
+SPACING = 6
+
+
+def make_boss():
+    return cq.Workplane().rect(4, 4).extrude(3).edges(">Z").fillet(0.5).val()
+
+
+def make_model(kind, size):
+    """
+    Returns a grid of filleted bosses having at least `size` objects of
+    the given kind, and the side length of the grid
+    """
+    boss = make_boss()
+    per_boss = len(getattr(boss, kind.capitalize())())
+    side = ceil(sqrt(ceil(size / per_boss)))
+    bosses = [
+        boss.moved(cq.Location(cq.Vector(SPACING * i, SPACING * j, 0)))
+        for i in range(side)
+        for j in range(side)
+    ]
+    return cq.Compound.makeCompound(bosses), side * SPACING
+
+
+def make_selectors(length):
+    """
+    Returns one instance of each selector class, each covering a part
+    of a grid of the given side length
+    """
+    c = (length / 2, length / 2, 0)
+    below = (length / 2, length / 2, -1)
+    r = length / 4
+    holes = [
+        CylinderSelector((x, y, -1), "Z", 5, SPACING / 2)
+        for x in range(0, int(length), int(length) // 10 or 1)
+        for y in range(0, int(length), int(length) // 20 or 1)
+    ]
+    return [
+        InfiniteCylinderSelector(c, "Z", r),
+        InfHollowCylinderSelector(c, "Z", r, r / 2),
+        CylinderSelector(below, "Z", 2, r),
+        HollowCylinderSelector(below, "Z", 2, r, r / 2),
+        SphereSelector(c, r),
+        HollowSphereSelector(c, r, r / 2),
+        OrientedBoxSelector(below, "Z", 2 * r, r, 2, xdir=(1, 1, 0)),
+        SlabSelector((0, 0, 1), "Z", 1),
+        ConeSelector(below, "Z", 5, r, r / 2),
+        UnionSelector(*holes),
+    ]
+
+
+def run(sizes, kinds, runs):
+    results = {}
+    for kind in kinds:
+        for size in sizes:
+            model, length = make_model(kind, size)
+            objects = getattr(model, kind.capitalize())()
+            for selector in make_selectors(length):
+                selected, elapsed, peak = utils.measure(
+                    selector.filter, objects, runs=runs
+                )
+                key = "{}/{}/{}".format(type(selector).__name__, kind, size)
+                results[key] = {
+                    "objects": len(objects),
+                    "selected": len(selected),
+                    "seconds": elapsed,
+                    "per_object": elapsed / len(objects),
+                    "peak_memory": peak,
+                }
+                print(
+                    "{:<45} {:>8} objects {:>9.2f} us/object {:>9.1f} MB peak".format(
+                        key, len(objects), elapsed / len(objects) * 1e6, peak / 1e6
+                    )
+                )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=KINDS)
+    utils.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.kinds, args.runs)
+    return utils.report(
+        BENCHMARK_NAME, results, args, "per_object", unit_scale=1e6, unit="us"
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import json
+import os
+import statistics
+import time
+import tracemalloc
+
+BASELINES_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+# default number of timed runs of each measurement
+RUNS = 3
+
+
+def measure(fct, *args, runs=RUNS, memory=True, setup=None, **kwargs):
+    """
+    Calls fct `runs` times and returns the result of the last call, the
+    median elapsed wall time in seconds and the peak memory allocated by
+    Python during one more call in bytes, or None if memory is False.
+    The timed calls run without tracemalloc, which slows them down.
+
+    If given, setup is called before each call and returns the positional
+    arguments of fct, for functions modifying their inputs.
+    """
+
+    def call():
+        return fct(*(setup() if setup else args), **kwargs)
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = call()
+        timings.append(time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            call()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return result, statistics.median(timings), peak
+
+
+def baseline_path(name):
+    return os.path.join(BASELINES_DIR, name + ".json")
+
+
+def load_baseline(name):
+    """
+    Returns the stored baseline of the named benchmark, or an empty dict
+    """
+    try:
+        with open(baseline_path(name), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(name, results):
+    with open(baseline_path(name), "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def find_regressions(results, baseline, tolerance, metric):
+    """
+    Returns the keys of results whose metric is more than `tolerance`
+    (relative) above the baseline, with the measured and baseline values
+    """
+    regressions = []
+    for key, values in results.items():
+        if key not in baseline:
+            continue
+        expected = baseline[key][metric]
+        if values[metric] > expected * (1 + tolerance):
+            regressions.append((key, values[metric], expected))
+    return regressions
+
+
+def add_arguments(parser, runs=RUNS):
+    """
+    Adds the command line options shared by all the benchmarks
+    """
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=runs,
+        help="number of runs the median time is taken over (default {})".format(runs),
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="store the results as the new baseline",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="relative slowdown above which a result is flagged (default 0.5)",
+    )
+
+
+def report(name, results, args, metric, unit_scale=1.0, unit=""):
+    """
+    Compares the results with the stored baseline, or stores them, and
+    returns the process exit code (1 if a regression was found)
+    """
+    if args.update_baseline:
+        baseline = load_baseline(name)
+        baseline.update(results)
+        save_baseline(name, baseline)
+        print("Baseline stored in {}".format(baseline_path(name)))
+        return 0
+
+    baseline = load_baseline(name)
+    if not baseline:
+        print("No baseline stored for {}".format(name))
+        return 0
+
+    regressions = find_regressions(results, baseline, args.tolerance, metric)
+    for key, measured, expected in regressions:
+        print(
+            "REGRESSION {}: {:.3f}{} (baseline {:.3f}{})".format(
+                key, measured * unit_scale, unit, expected * unit_scale, unit
+            )
+        )
+    if not regressions:
+        print("No regression against the baseline")
+    return 1 if regressions else 0
@@ -1,5 +1,7 @@
 from .apply_to_each_face import (
     applyToEachFace,
+    iterApplyToEachFace,
+    Checkpoint,
     XAxisInPlane,
     XAxisClosestTo,
     WORLD_AXIS_UNIT_VECTORS_XYZ,
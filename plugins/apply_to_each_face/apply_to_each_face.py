@@ -1,6 +1,278 @@
-from typing import Callable, List, TypeVar, Union, Literal
+import multiprocessing
+import os
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from math import ceil
+from typing import Callable, Iterator, List, Optional, Tuple, Union, Literal
 
 import cadquery as cq
+import numpy as np
+
+from OCP.BRepGProp import BRepGProp
+from OCP.GProp import GProp_GProps
+
+# number of chunks of faces sent to each worker process in parallel mode
+CHUNKS_PER_PROCESS = 4
+# default tolerance of the lengths compared to find congruent faces
+CONGRUENCE_TOLERANCE = 1e-4
+# default number of faces between two saves of a Checkpoint
+CHECKPOINT_INTERVAL = 100
+# number of faces whose coordinate systems are computed at once when streaming
+STREAM_CHUNK_SIZE = 64
+
+
+def _apply_to_face(
+    face: cq.Face,
+    f_workplane_selector: Callable[[cq.Face], cq.Workplane],
+    f_draw: Callable[[cq.Workplane, cq.Face], cq.Workplane],
+) -> cq.Shape:
+    wp_face = f_workplane_selector(face)
+
+    return f_draw(wp_face, face).vals()[0]
+
+
+def _workplanes(
+    faces: List[cq.Face], f_workplane_selector: Callable[[cq.Face], cq.Workplane]
+) -> List[cq.Workplane]:
+    """
+    Returns the workplane of each face. The coordinate systems of all
+    the faces are computed at once if f_workplane_selector has a `planes`
+    method (like XAxisInPlane and XAxisClosestTo).
+    """
+    if hasattr(f_workplane_selector, "planes"):
+        return [cq.Workplane(plane) for plane in f_workplane_selector.planes(faces)]
+    return [f_workplane_selector(face) for face in faces]
+
+
+def _iter_workplanes(
+    faces: List[cq.Face], f_workplane_selector: Callable[[cq.Face], cq.Workplane]
+) -> Iterator[cq.Workplane]:
+    """
+    Yields the workplane of each face when it is needed: one face at
+    a time, or STREAM_CHUNK_SIZE faces at a time if f_workplane_selector
+    has a `planes` method
+    """
+    if not hasattr(f_workplane_selector, "planes"):
+        for face in faces:
+            yield f_workplane_selector(face)
+        return
+
+    for start in range(0, len(faces), STREAM_CHUNK_SIZE):
+        yield from _workplanes(
+            faces[start : start + STREAM_CHUNK_SIZE], f_workplane_selector
+        )
+
+
+def _to_brep(shape: cq.Shape) -> bytes:
+    data = BytesIO()
+    shape.exportBin(data)
+    return data.getvalue()
+
+
+def _from_brep(data: bytes) -> cq.Shape:
+    return cq.Shape.importBin(BytesIO(data))
+
+
+# callbacks of the worker processes, set by _init_worker
+_worker_callbacks = None
+
+
+def _init_worker(f_workplane_selector, f_draw):
+    global _worker_callbacks
+    _worker_callbacks = (f_workplane_selector, f_draw)
+
+
+def _apply_in_worker(face_brep: bytes) -> bytes:
+    face = _from_brep(face_brep)
+
+    return _to_brep(_apply_to_face(face, *_worker_callbacks))
+
+
+def _apply_in_processes(
+    faces: List[cq.Face],
+    f_workplane_selector: Callable[[cq.Face], cq.Workplane],
+    f_draw: Callable[[cq.Workplane, cq.Face], cq.Workplane],
+    processes: Optional[int],
+) -> List[cq.Shape]:
+    """
+    Runs the callbacks on each face in a pool of processes, sending the
+    faces and the results between processes as binary BREP.
+
+    On Linux the worker processes are forked, so the callbacks (for
+    instance lambdas) are inherited and do not need to be picklable.
+    Elsewhere forking is unsafe and the platform default is used, which
+    requires picklable callbacks.
+    """
+    processes = processes or os.cpu_count() or 1
+    if sys.platform.startswith("linux"):
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
+    chunksize = max(1, ceil(len(faces) / (processes * CHUNKS_PER_PROCESS)))
+
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(f_workplane_selector, f_draw),
+    ) as executor:
+        results = executor.map(
+            _apply_in_worker, [_to_brep(face) for face in faces], chunksize=chunksize
+        )
+        return [_from_brep(result) for result in results]
+
+
+def _congruence_signature(face: cq.Face, plane: cq.Plane, tolerance: float) -> tuple:
+    """
+    Returns a key equal for faces that are the same in their own
+    coordinate system: same surface type, area, edge lengths and
+    vertices in face coordinates, up to tolerance.
+    """
+
+    def rounded(x: float) -> int:
+        return round(x / tolerance)
+
+    return (
+        face.geomType(),
+        rounded(face.Area()),
+        tuple(sorted(rounded(e.Length()) for e in face.Edges())),
+        tuple(
+            sorted(
+                tuple(rounded(c) for c in plane.toLocalCoords(v.Center()).toTuple())
+                for v in face.Vertices()
+            )
+        ),
+    )
+
+
+def _apply_to_congruent_faces(
+    faces: List[cq.Face],
+    f_workplane_selector: Callable[[cq.Face], cq.Workplane],
+    f_draw: Callable[[cq.Workplane, cq.Face], cq.Workplane],
+    tolerance: float,
+    parallel: bool,
+    processes: Optional[int],
+) -> List[cq.Shape]:
+    """
+    Calls f_draw once for each group of congruent faces and places
+    copies of the drawn shape on the other faces of the group.
+    The copies share the geometry of the first drawn shape.
+    """
+    workplanes = _workplanes(faces, f_workplane_selector)
+    planes = [wp_face.plane for wp_face in workplanes]
+    groups = {}
+    for i, (face, plane) in enumerate(zip(faces, planes)):
+        groups.setdefault(_congruence_signature(face, plane, tolerance), []).append(i)
+
+    first_indices = [indices[0] for indices in groups.values()]
+    if parallel:
+        drawn = _apply_in_processes(
+            [faces[i] for i in first_indices], f_workplane_selector, f_draw, processes
+        )
+    else:
+        drawn = [f_draw(workplanes[i], faces[i]).vals()[0] for i in first_indices]
+
+    results = [None] * len(faces)
+    for indices, shape in zip(groups.values(), drawn):
+        to_local = planes[indices[0]].location.inverse
+        results[indices[0]] = shape
+        for i in indices[1:]:
+            results[i] = shape.moved(planes[i].location * to_local)
+
+    return results
+
+
+class Checkpoint:
+    """
+    Shapes drawn so far by `iterApplyToEachFace` or `applyToEachFace`.
+
+    If a path is given, the shapes are saved as a compound in a binary
+    BREP file every `save_every` faces and when the drawing stops
+    (finished, failed or cancelled), and they are loaded back when
+    a Checkpoint is created with the same path, so that the drawing
+    resumes where it stopped. The resumed drawing must be done on
+    the same faces, in the same order.
+    """
+
+    def __init__(
+        self, path: Optional[str] = None, save_every: int = CHECKPOINT_INTERVAL
+    ):
+        self.path = path
+        self.save_every = save_every
+        self.shapes: List[cq.Shape] = []
+
+        if path is not None and os.path.exists(path):
+            self.shapes = list(cq.Shape.importBin(path))
+
+    def __len__(self) -> int:
+        return len(self.shapes)
+
+    def add(self, shape: cq.Shape):
+        self.shapes.append(shape)
+        if len(self.shapes) % self.save_every == 0:
+            self.save()
+
+    def compound(self) -> cq.Compound:
+        return cq.Compound.makeCompound(self.shapes)
+
+    def save(self):
+        """
+        Saves the shapes, does nothing if the checkpoint has no path
+        """
+        if self.path is None:
+            return
+        # do not leave a truncated file if interrupted while writing
+        tmp_path = self.path + ".tmp"
+        self.compound().exportBin(tmp_path)
+        os.replace(tmp_path, self.path)
+
+
+def iterApplyToEachFace(
+    wp: cq.Workplane,
+    f_workplane_selector: Callable[[cq.Face], cq.Workplane],
+    f_draw: Callable[[cq.Workplane, cq.Face], cq.Workplane],
+    progress: Optional[Callable[[int, int], None]] = None,
+    checkpoint: Optional[Checkpoint] = None,
+) -> Iterator[Tuple[cq.Face, cq.Workplane, cq.Shape]]:
+    """
+    Streaming variant of `applyToEachFace(..)`: draws on the
+    selected faces one at a time and yields `(face, workplane, shape)`
+    for each of them, the shapes are not combined. Stopping the
+    iteration cancels the drawing of the remaining faces.
+
+    :param wp: Workplane with some faces selected
+    :param f_workplane_selector: see `applyToEachFace`
+    :param f_draw: see `applyToEachFace`
+    :param progress: callback called with the number of faces
+        drawn so far and the total number of faces after each face
+    :param checkpoint: Checkpoint keeping the drawn shapes. The faces
+        it already has shapes for are skipped.
+    """
+    faces = wp.objects
+    done = len(checkpoint) if checkpoint is not None else 0
+    if done > len(faces):
+        raise ValueError(
+            "The checkpoint has %d shapes for %d faces" % (done, len(faces))
+        )
+
+    remaining = faces[done:]
+    try:
+        for face, wp_face in zip(
+            remaining, _iter_workplanes(remaining, f_workplane_selector)
+        ):
+            shape = f_draw(wp_face, face).vals()[0]
+            done += 1
+            if checkpoint is not None:
+                checkpoint.add(shape)
+            if progress is not None:
+                progress(done, len(faces))
+
+            yield face, wp_face, shape
+    finally:
+        if checkpoint is not None:
+            checkpoint.save()
 
 
 def applyToEachFace(
@@ -9,6 +281,12 @@ def applyToEachFace(
     f_draw: Callable[[cq.Workplane, cq.Face], cq.Workplane],
     combine: Union[bool, Literal["cut", "a", "s"]] = True,
     clean: bool = True,
+    parallel: bool = False,
+    processes: Optional[int] = None,
+    reuse_congruent: bool = False,
+    congruence_tolerance: float = CONGRUENCE_TOLERANCE,
+    progress: Optional[Callable[[int, int], None]] = None,
+    checkpoint: Optional[Checkpoint] = None,
 ) -> cq.Workplane:
     """
     Basically equivalent to `Workplane.each(..)` but
@@ -30,14 +308,64 @@ def applyToEachFace(
         the parent solids.
     :param boolean clean: call :py:meth:`clean` afterwards to
         have a clean shape
+    :param parallel: run the callbacks in a pool of processes.
+        The faces and the drawn shapes are sent between processes
+        as BREP and all the drawn shapes are combined at once.
+        Except on Linux, where processes are forked,
+        the callbacks must be picklable, i.e. not lambdas.
+    :param processes: number of processes used in parallel mode,
+        the number of CPUs by default
+    :param reuse_congruent: call `f_draw` only once for each group
+        of faces that are the same in their own coordinate system
+        (same surface type, area, edge lengths and vertices) and
+        place copies of the drawn shape on the other faces of
+        the group. Only valid if `f_draw` draws the same thing on
+        faces that are the same in their coordinate system.
+    :param congruence_tolerance: tolerance of the lengths compared
+        to find faces that are the same
+    :param progress: callback called with the number of faces
+        drawn so far and the total number of faces after each face.
+        Not available with `parallel` and `reuse_congruent`.
+    :param checkpoint: Checkpoint keeping the drawn shapes, used
+        to resume an interrupted drawing (see `Checkpoint`).
+        Not available with `parallel` and `reuse_congruent`.
     """
 
-    def each_callback(face):
-        wp_face = f_workplane_selector(face)
+    if (parallel or reuse_congruent) and (
+        progress is not None or checkpoint is not None
+    ):
+        raise ValueError(
+            "progress and checkpoint can not be used with parallel or reuse_congruent"
+        )
+
+    if reuse_congruent:
+        results = _apply_to_congruent_faces(
+            wp.objects,
+            f_workplane_selector,
+            f_draw,
+            congruence_tolerance,
+            parallel,
+            processes,
+        )
+    elif parallel:
+        results = _apply_in_processes(
+            wp.objects, f_workplane_selector, f_draw, processes
+        )
+    else:
+        results = [
+            shape
+            for _, _, shape in iterApplyToEachFace(
+                wp, f_workplane_selector, f_draw, progress, checkpoint
+            )
+        ]
+        if checkpoint is not None:
+            results = list(checkpoint.shapes)
 
-        return f_draw(wp_face, face).vals()[0]
+    for r in results:
+        if isinstance(r, cq.Wire) and not r.forConstruction:
+            wp._addPendingWire(r)
 
-    return wp.each(each_callback, combine=combine, clean=clean)
+    return wp._combineWithBase(results, combine, clean)
 
 
 v_x_unit = cq.Vector(1, 0, 0)
@@ -77,10 +405,32 @@ WORLD_AXIS_PLANES_ZX_XY_YZ = [WORLD_ZX_NORMAL, WORLD_XY_NORMAL, WORLD_YZ_NORMAL]
 WORLD_AXIS_PLANES_ZX_YZ_XY = [WORLD_ZX_NORMAL, WORLD_YZ_NORMAL, WORLD_XY_NORMAL]
 
 
-def _create_workplane(
-    v_center: cq.Vector, v_xaxis: cq.Vector, v_zaxis: cq.Vector
-) -> cq.Workplane:
-    return cq.Workplane(cq.Plane(v_center, v_xaxis, v_zaxis), origin=v_center)
+def _normals_and_centers(faces: List[cq.Face]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the normals (`Face.normalAt()`) and centers (`Face.Center()`)
+    of the faces as two (n, 3) arrays
+    """
+    normals = np.empty((len(faces), 3))
+    centers = np.empty((len(faces), 3))
+    for i, face in enumerate(faces):
+        normals[i] = face.normalAt().toTuple()
+        # same as Face.Center() without its overhead
+        properties = GProp_GProps()
+        BRepGProp.SurfaceProperties_s(face.wrapped, properties)
+        center = properties.CentreOfMass()
+        centers[i] = (center.X(), center.Y(), center.Z())
+    return normals, centers
+
+
+def _create_planes(
+    centers: np.ndarray, xaxes: np.ndarray, zaxes: np.ndarray
+) -> List[cq.Plane]:
+    return [
+        cq.Plane(cq.Vector(*center), cq.Vector(*xaxis), cq.Vector(*zaxis))
+        for center, xaxis, zaxis in zip(
+            centers.tolist(), xaxes.tolist(), zaxes.tolist()
+        )
+    ]
 
 
 class XAxisInPlane:
@@ -103,29 +453,35 @@ class XAxisInPlane:
     """
 
     def __init__(self, plane_normals: List[cq.Vector], tolerance: float = 1e-3):
-        self.__plane_normals = [x.normalized() for x in plane_normals]
+        self.__plane_normals = np.array(
+            [x.normalized().toTuple() for x in plane_normals]
+        ).reshape(-1, 3)
         self.__tolerance = tolerance
 
-    def __call__(self, face: cq.Face) -> cq.Workplane:
-        v_zaxis = face.normalAt()
-
-        selected_plane_normal = None
-        for plane_normal in self.__plane_normals:
-            plane_normal_projection = plane_normal.dot(v_zaxis)
-            if (1 - abs(plane_normal_projection)) > self.__tolerance:
-                selected_plane_normal = plane_normal
-                break
-        if selected_plane_normal is None:
+    def planes(self, faces: List[cq.Face]) -> List[cq.Plane]:
+        """
+        Returns the coordinate systems of all the faces,
+        computed at once with array operations
+        """
+        v_zaxes, v_centers = _normals_and_centers(faces)
+
+        # for each face, the first plane normal that is not
+        # too close to the face normal
+        valid = (1 - np.abs(v_zaxes @ self.__plane_normals.T)) > self.__tolerance
+        invalid_faces = ~valid.any(axis=1)
+        if invalid_faces.any():
             raise ValueError(
-                "All plane normals are too close to face normal %s" % v_zaxis
+                "All plane normals are too close to face normal %s"
+                % cq.Vector(*v_zaxes[np.argmax(invalid_faces)])
             )
+        selected_plane_normals = self.__plane_normals[np.argmax(valid, axis=1)]
 
-        v_xaxis = selected_plane_normal.cross(v_zaxis)
-
-        return _create_workplane(face.Center(), v_xaxis, v_zaxis)
+        v_xaxes = np.cross(selected_plane_normals, v_zaxes)
 
+        return _create_planes(v_centers, v_xaxes, v_zaxes)
 
-T = TypeVar("T")
+    def __call__(self, face: cq.Face) -> cq.Workplane:
+        return cq.Workplane(self.planes([face])[0])
 
 
 class XAxisClosestTo:
@@ -152,53 +508,38 @@ class XAxisClosestTo:
     def __init__(self, candidate_vectors: List[cq.Vector], tolerance: float = 1e-3):
 
         self.__tolerance = tolerance
-        self.__weighted_candidate_vectors = [
-            (i, x.normalized()) for i, x in enumerate(candidate_vectors)
-        ]
+        self.__candidate_vectors = np.array(
+            [x.normalized().toTuple() for x in candidate_vectors]
+        ).reshape(-1, 3)
 
-    def __get_best_candidate(
-        self,
-        objectlist: List[T],
-        key_selector: Callable[[T], float],
-        cluster_sort_key: Callable[[T], float],
-    ):
-        # idea borrowed from
-        # https://github.com/CadQuery/cadquery/blob/a71a93ea274089ddbd48dbbd84d84710fc82a432/cadquery/selectors.py#L343
-        key_and_obj = []
-        for obj in objectlist:
-            key_and_obj.append((key_selector(obj), obj))
-        key_and_obj.sort(key=lambda x: x[0])
-
-        first_cluster = []
-        start = key_and_obj[0][0]
-        for key, obj in key_and_obj:
-            if abs(key - start) <= self.__tolerance:
-                first_cluster.append(obj)
-            else:
-                break
-        first_cluster.sort(key=cluster_sort_key)
-
-        return first_cluster[0]
-
-    def __call__(self, face: cq.Face) -> cq.Workplane:
-        v_zaxis = face.normalAt()
+    def planes(self, faces: List[cq.Face]) -> List[cq.Plane]:
+        """
+        Returns the coordinate systems of all the faces,
+        computed at once with array operations
+        """
+        v_zaxes, v_centers = _normals_and_centers(faces)
 
         # Choosing user-specified vector with minimum
         # face normal projection. If multiple vectors
-        # have the same projection, the one that
-        # comes first in the list is chosen
-        best_xax_candidate = self.__get_best_candidate(
-            self.__weighted_candidate_vectors,
-            lambda x: abs(x[1].dot(v_zaxis)),
-            lambda x: x[0],
-        )[1]
+        # have the same projection (up to tolerance), the one
+        # that comes first in the list is chosen
+        projections = np.abs(v_zaxes @ self.__candidate_vectors.T)
+        closest = (
+            projections - projections.min(axis=1, keepdims=True) <= self.__tolerance
+        )
+        best_xax_candidates = self.__candidate_vectors[np.argmax(closest, axis=1)]
 
         # projecting onto face plane and normalizing
-        v_xaxis = (
-            best_xax_candidate - v_zaxis.multiply(best_xax_candidate.dot(v_zaxis))
-        ).normalized()
+        v_xaxes = best_xax_candidates - v_zaxes * np.sum(
+            best_xax_candidates * v_zaxes, axis=1, keepdims=True
+        )
+        v_xaxes /= np.linalg.norm(v_xaxes, axis=1, keepdims=True)
 
-        return _create_workplane(face.Center(), v_xaxis, v_zaxis)
+        return _create_planes(v_centers, v_xaxes, v_zaxes)
+
+    def __call__(self, face: cq.Face) -> cq.Workplane:
+        return cq.Workplane(self.planes([face])[0])
 
 
 cq.Workplane.applyToEachFace = applyToEachFace
+cq.Workplane.iterApplyToEachFace = iterApplyToEachFace
@@ -18,9 +18,9 @@ author = "Fedor Kotov"
 author_email = "fedorkotov@gmail.com"
 packages = []  # List of packages that will be installed with this plugin
 py_modules = ["apply_to_each_face"]  # Put the name of your plugin's .py file here
-install_requires = (
-    []
-)  # Any dependencies that pip also needs to install to make this plugin work
+install_requires = [
+    "numpy"
+]  # Any dependencies that pip also needs to install to make this plugin work
 
 
 setup(
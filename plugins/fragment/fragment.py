@@ -1,8 +1,18 @@
 import cadquery as cq
+import logging
+import numpy as np
+import time
 
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
 from typing import (
+    Dict,
+    Iterator,
     List,
     Optional,
+    Sequence,
+    Tuple,
     Union,
     cast,
 )
@@ -13,47 +23,657 @@ from cadquery.occ_impl.shapes import (
     Compound,
 )
 
-from OCP.BRepAlgoAPI import BRepAlgoAPI_BuilderAlgo
-from OCP.BOPAlgo import BOPAlgo_GlueEnum
-from OCP.TopTools import TopTools_ListOfShape
+from OCP.BRepBndLib import BRepBndLib
+from OCP.BRepTools import BRepTools_ReShape
+from OCP.Bnd import Bnd_Box
+from OCP.BOPAlgo import BOPAlgo_Builder, BOPAlgo_GlueEnum, BOPAlgo_PaveFiller
+from OCP.Message import Message_Gravity
+from OCP.ShapeUpgrade import ShapeUpgrade_UnifySameDomain
+from OCP.TopTools import TopTools_ListOfShape, TopTools_MapOfShape
 from OCP.TopoDS import TopoDS_Iterator
 
 
+# shapes whose bounding boxes are closer than this are fragmented together
+CLUSTER_GAP = 1e-5
+# maximum number of pairs of solids checked for overlaps by glue="auto"
+GLUE_CHECKS = 50
+# overlap volume, relative to the smallest solid, above which solids overlap
+GLUE_OVERLAP_VOLUME = 1e-6
+# glue mode used for each class of inputs by glue="auto"
+AUTO_GLUE = {"disjoint": "full", "touching": "shift", "overlapping": False}
+GLUE_MODES = {
+    True: BOPAlgo_GlueEnum.BOPAlgo_GlueShift,
+    "shift": BOPAlgo_GlueEnum.BOPAlgo_GlueShift,
+    "full": BOPAlgo_GlueEnum.BOPAlgo_GlueFull,
+}
+# values accepted by the glue argument
+GLUE_VALUES = (False, True, "shift", "full", "auto")
+# values accepted by the clean argument of Workplane.fragment
+CLEAN_VALUES = (False, True, "scoped")
+
+# phases of a fragment operation timed in FragmentReport, in order
+PHASES = (
+    "classify",
+    "cluster",
+    "arguments",
+    "intersection",
+    "building",
+    "results",
+    "history",
+    "clean",
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Provenance:
+    """
+    Origin of the fragments of a fragment operation, read from the
+    history of the boolean builder.
+
+    The inputs are the fragmented shapes in the order they were given
+    (a compound fragmented with its children counts one input for each
+    child, a compound passed as argument is one input) and the fragments
+    are the children of the result compound, in order.
+
+    :ivar sources: for each fragment, the indices of the inputs it comes from
+    :ivar fragments: for each input, the indices of its fragments
+    """
+
+    def __init__(self, sources: List[List[int]], inputs: int):
+        self.sources = sources
+        self.fragments: List[List[int]] = [[] for _ in range(inputs)]
+        for k, indices in enumerate(sources):
+            for i in indices:
+                self.fragments[i].append(k)
+
+
+class FragmentReport:
+    """
+    Timings and diagnostics of a fragment operation.
+
+    The timings are summed over the boolean builders, which run in
+    other processes when clustering with processes > 1, so their total
+    can be larger than the wall time of the operation.
+
+    :ivar timings: time in seconds spent in each of PHASES
+    :ivar wall_time: wall time of the whole operation in seconds
+    :ivar inputs: number of fragmented shapes
+    :ivar outputs: number of fragments
+    :ivar builders: number of boolean builders run
+    :ivar fuzzy_value: fuzzy value of the builders
+    :ivar glue: glue mode used by each builder ("off", "shift" or "full")
+    :ivar warnings: number of each OCCT BOPAlgo warning raised by the builders
+    """
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {phase: 0.0 for phase in PHASES}
+        self.wall_time = 0.0
+        self.inputs = 0
+        self.outputs = 0
+        self.builders = 0
+        self.fuzzy_value = 0.0
+        self.glue: List[str] = []
+        self.warnings: Dict[str, int] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Adds the time spent in the with block to the named phase
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def merge(self, other: "FragmentReport"):
+        """
+        Adds the timings, builders and warnings of other to this report
+        """
+        for name, seconds in other.timings.items():
+            self.timings[name] += seconds
+        self.builders += other.builders
+        self.glue.extend(other.glue)
+        for key, count in other.warnings.items():
+            self.warnings[key] = self.warnings.get(key, 0) + count
+
+    def __str__(self):
+        lines = [
+            "fragment: {} inputs, {} fragments, {} builders, {:.3f} s".format(
+                self.inputs, self.outputs, self.builders, self.wall_time
+            ),
+            "fuzzy value {}, glue {}".format(
+                self.fuzzy_value, ", ".join(sorted(set(self.glue))) or "-"
+            ),
+        ]
+        lines.extend(
+            "  {:<14} {:9.3f} s".format(name, self.timings[name])
+            for name in PHASES
+            if self.timings[name]
+        )
+        lines.extend(
+            "  warning {} x{}".format(key, count)
+            for key, count in sorted(self.warnings.items())
+        )
+        return "\n".join(lines)
+
+
+class FragmentError(RuntimeError):
+    """
+    Raised when the OCCT boolean builder fails to fragment the shapes.
+
+    :ivar errors: number of each OCCT BOPAlgo error raised by the builder
+    :ivar report: the FragmentReport of the operation up to the failure
+    """
+
+    def __init__(self, errors: Dict[str, int], report: FragmentReport):
+        super().__init__(
+            "Fragment failed: {}".format(
+                ", ".join("{} x{}".format(k, n) for k, n in sorted(errors.items()))
+            )
+        )
+        self.errors = errors
+        self.report = report
+
+    def __reduce__(self):
+        # raised in worker processes, pickled with its attributes
+        return type(self), (self.errors, self.report)
+
+
+def _alerts(algo, gravity) -> Dict[str, int]:
+    """
+    Returns the number of each alert of the given gravity in the report
+    of a BOPAlgo algorithm
+    """
+    alerts: Dict[str, int] = {}
+    for alert in algo.GetReport().GetAlerts(gravity):
+        key = alert.GetMessageKey()
+        alerts[key] = alerts.get(key, 0) + 1
+    return alerts
+
+
+def _leaves(shape: Shape) -> Sequence[Shape]:
+    return tuple(shape) if isinstance(shape, Compound) else (shape,)
+
+
+def _classify(shapes: Sequence[Shape], tol: float) -> str:
+    """
+    Classifies the shapes as "disjoint", "touching" (only sharing
+    boundaries) or "overlapping". Bounding boxes discard most pairs of
+    shapes, at most GLUE_CHECKS pairs are checked with distance and
+    common volume computations, above that they are assumed to overlap.
+    """
+    leaves = [leaf for shape in shapes for leaf in _leaves(shape)]
+    if not all(isinstance(leaf, Solid) for leaf in leaves):
+        return "overlapping"
+
+    boxes = _bounding_boxes(leaves, tol + CLUSTER_GAP)
+    pairs = list(_overlapping_pairs(boxes))
+    if not pairs:
+        return "disjoint"
+
+    # boxes only touching each other can not hold overlapping solids
+    inner_boxes = _bounding_boxes(leaves, -CLUSTER_GAP)
+    inner_pairs = [
+        (i, j)
+        for i, j in pairs
+        if np.all(inner_boxes[i, :3] < inner_boxes[j, 3:])
+        and np.all(inner_boxes[j, :3] < inner_boxes[i, 3:])
+    ]
+    if len(inner_pairs) > GLUE_CHECKS:
+        return "overlapping"
+
+    touching = len(inner_pairs) < len(pairs)
+    for i, j in inner_pairs:
+        a, b = leaves[i], leaves[j]
+        if a.distance(b) > tol + CLUSTER_GAP:
+            continue
+        touching = True
+        common = a.intersect(b).Volume()
+        if common > GLUE_OVERLAP_VOLUME * min(a.Volume(), b.Volume()):
+            return "overlapping"
+    return "touching" if touching else "disjoint"
+
+
+def _check_glue(glue: Union[bool, str]):
+    if glue not in GLUE_VALUES:
+        raise ValueError(
+            "Unknown glue mode {!r}, use one of {}".format(
+                glue, ", ".join(repr(value) for value in GLUE_VALUES)
+            )
+        )
+
+
+def _fragment_shapes(
+    shapes: Sequence[Shape],
+    glue: Union[bool, str] = False,
+    tol: Optional[float] = None,
+    use_obb: bool = False,
+    parallel: bool = True,
+    nondestructive: bool = False,
+    report: Optional[FragmentReport] = None,
+) -> Tuple[List[Shape], List[List[int]]]:
+    """
+    Fragments the shapes together with a single boolean builder, and
+    returns the fragments and the indices of the shapes each comes from.
+    The timings and warnings of the builder are added to the report.
+    """
+
+    if report is None:
+        report = FragmentReport()
+
+    if glue == "auto":
+        with report.phase("classify"):
+            kind = _classify(shapes, tol or 0)
+        glue = AUTO_GLUE[kind]
+        logger.info(
+            "fragment: %d %s shapes, glue mode %s", len(shapes), kind, glue or "off"
+        )
+
+    # the intersection and building steps of BRepAlgoAPI_BuilderAlgo,
+    # run separately to time them and read their reports
+    with report.phase("arguments"):
+        arg = TopTools_ListOfShape()
+        for obj in shapes:
+            arg.Append(obj.wrapped)
+        filler = BOPAlgo_PaveFiller()
+        filler.SetArguments(arg)
+        if glue:
+            filler.SetGlue(GLUE_MODES[glue])
+        if tol:
+            filler.SetFuzzyValue(tol)
+        filler.SetUseOBB(use_obb)
+        filler.SetRunParallel(parallel)
+        filler.SetNonDestructive(nondestructive)
+        fragment_op = BOPAlgo_Builder()
+        fragment_op.SetArguments(arg)
+        fragment_op.SetRunParallel(parallel)
+    report.builders += 1
+    report.glue.append("shift" if glue is True else glue or "off")
+
+    with report.phase("intersection"):
+        filler.Perform()
+    if filler.HasErrors():
+        raise FragmentError(_alerts(filler, Message_Gravity.Message_Fail), report)
+
+    with report.phase("building"):
+        fragment_op.PerformWithFiller(filler)
+    # the builder report includes the warnings of the intersection
+    for key, count in _alerts(fragment_op, Message_Gravity.Message_Warning).items():
+        report.warnings[key] = report.warnings.get(key, 0) + count
+    if fragment_op.HasErrors():
+        raise FragmentError(_alerts(fragment_op, Message_Gravity.Message_Fail), report)
+
+    with report.phase("results"):
+        it = TopoDS_Iterator(fragment_op.Shape())
+        los = []
+        while it.More():
+            los.append(Shape.cast(it.Value()))
+            it.Next()
+
+    # the builder history gives the fragments of each input
+    with report.phase("history"):
+        index = {fragment: k for k, fragment in enumerate(los)}
+        sources: List[List[int]] = [[] for _ in los]
+        for i, shape in enumerate(shapes):
+            for leaf in _leaves(shape):
+                images = list(fragment_op.Modified(leaf.wrapped))
+                if not images and not fragment_op.IsDeleted(leaf.wrapped):
+                    images = [leaf.wrapped]
+                for image in images:
+                    k = index.get(Shape.cast(image))
+                    if k is not None and i not in sources[k][-1:]:
+                        sources[k].append(i)
+    return los, sources
+
+
+def _bounding_boxes(shapes: Sequence[Shape], gap: float) -> np.ndarray:
+    """
+    Returns the bounding boxes of the shapes enlarged by gap,
+    as a (n, 6) array of (xmin, ymin, zmin, xmax, ymax, zmax)
+    """
+    boxes = np.empty((len(shapes), 6))
+    for i, shape in enumerate(shapes):
+        # not as tight as Shape.BoundingBox() but much faster to compute
+        bb = Bnd_Box()
+        BRepBndLib.Add_s(shape.wrapped, bb, True)
+        boxes[i] = bb.Get()
+    boxes[:, :3] -= gap
+    boxes[:, 3:] += gap
+    return boxes
+
+
+def _overlapping_pairs(boxes: np.ndarray) -> Iterator[Tuple[int, int]]:
+    """
+    Yields the pairs of indices of overlapping boxes, sweeping
+    the boxes sorted along X
+    """
+    order = np.argsort(boxes[:, 0], kind="stable")
+    sorted_xmin = boxes[order, 0]
+    for k, i in enumerate(order):
+        # the next boxes along X starting before the end of box i
+        end = np.searchsorted(sorted_xmin, boxes[i, 3], side="right")
+        candidates = order[k + 1 : end]
+        overlap = np.all(boxes[candidates, 1:3] <= boxes[i, 4:6], axis=1) & np.all(
+            boxes[candidates, 4:6] >= boxes[i, 1:3], axis=1
+        )
+        for j in candidates[overlap]:
+            yield int(i), int(j)
+
+
+def _overlapping(boxes: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """
+    Returns the mask of boxes overlapping at least one of others
+    """
+    mask = np.zeros(len(boxes), dtype=bool)
+    for other in others:
+        mask |= np.all(boxes[:, :3] <= other[3:], axis=1) & np.all(
+            boxes[:, 3:] >= other[:3], axis=1
+        )
+    return mask
+
+
+def _overlap_components(shapes: Sequence[Shape], gap: float) -> List[List[int]]:
+    """
+    Returns the indices of the shapes grouped by connected components
+    of the graph of overlapping bounding boxes
+    """
+    parent = list(range(len(shapes)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in _overlapping_pairs(_bounding_boxes(shapes, gap)):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    components = {}
+    for i in range(len(shapes)):
+        components.setdefault(find(i), []).append(i)
+    return list(components.values())
+
+
+def _to_brep(shapes: Sequence[Shape]) -> bytes:
+    # the shapes are sent as one compound to keep the topology they share
+    data = BytesIO()
+    Compound.makeCompound(shapes).exportBin(data)
+    return data.getvalue()
+
+
+def _from_brep(data: bytes) -> List[Shape]:
+    return list(Shape.importBin(BytesIO(data)))
+
+
+def _fragment_in_worker(
+    data: bytes, options: dict
+) -> Tuple[bytes, List[List[int]], FragmentReport]:
+    report = FragmentReport()
+    los, sources = _fragment_shapes(_from_brep(data), report=report, **options)
+    return _to_brep(los), sources, report
+
+
+def _fragment_clusters(
+    shapes: Sequence[Shape], options: dict, processes: int, report: FragmentReport
+) -> Tuple[List[Shape], List[List[int]]]:
+    """
+    Fragments separately each group of shapes with overlapping bounding
+    boxes, in a pool of processes if processes > 1. Shapes that do not
+    overlap any other are not fragmented.
+    """
+    with report.phase("cluster"):
+        components = _overlap_components(shapes, (options["tol"] or 0) + CLUSTER_GAP)
+    groups = [[shapes[i] for i in c] for c in components if len(c) > 1]
+
+    if processes > 1 and len(groups) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = executor.map(
+                _fragment_in_worker,
+                [_to_brep(group) for group in groups],
+                [options] * len(groups),
+            )
+            fragmented = []
+            for data, sources, group_report in results:
+                report.merge(group_report)
+                fragmented.append((_from_brep(data), sources))
+    else:
+        fragmented = [
+            _fragment_shapes(group, report=report, **options) for group in groups
+        ]
+    fragmented_groups = iter(fragmented)
+
+    los = []
+    sources = []
+    for c in components:
+        if len(c) > 1:
+            group_los, group_sources = next(fragmented_groups)
+            los.extend(group_los)
+            sources.extend([c[i] for i in indices] for indices in group_sources)
+        else:
+            leaves = _leaves(shapes[c[0]])
+            los.extend(leaves)
+            sources.extend([c[0]] for _ in leaves)
+    return los, sources
+
+
+def _fragment_incremental(
+    fragments: Sequence[Shape],
+    toAdd: Sequence[Shape],
+    options: dict,
+    cluster: bool,
+    processes: int,
+    report: FragmentReport,
+) -> Tuple[List[Shape], List[List[int]]]:
+    """
+    Adds shapes to already fragmented shapes, only the fragments
+    overlapping the added shapes are fragmented again
+    """
+    gap = (options["tol"] or 0) + CLUSTER_GAP
+    with report.phase("cluster"):
+        touched = _overlapping(
+            _bounding_boxes(fragments, gap), _bounding_boxes(toAdd, 0)
+        )
+
+    kept = [i for i, t in enumerate(touched) if not t]
+    # indices of the shapes fragmented again in the inputs
+    inputs = [i for i, t in enumerate(touched) if t] + [
+        len(fragments) + i for i in range(len(toAdd))
+    ]
+    toFragment = [fragments[i] for i in inputs[: len(inputs) - len(toAdd)]]
+    toFragment.extend(toAdd)
+
+    if cluster:
+        new_los, new_sources = _fragment_clusters(
+            toFragment, options, processes, report
+        )
+    else:
+        new_los, new_sources = _fragment_shapes(toFragment, report=report, **options)
+
+    los = [fragments[i] for i in kept] + new_los
+    sources = [[i] for i in kept] + [
+        [inputs[j] for j in indices] for indices in new_sources
+    ]
+    return los, sources
+
+
+def _unify(shape: Shape, neighbours: Sequence[Shape]) -> Shape:
+    """
+    Shape.clean that does not remove the edges and vertices of the given
+    shapes, so the faces and edges shape shares with them are not merged
+    """
+    keep = TopTools_MapOfShape()
+    for neighbour in neighbours:
+        for obj in neighbour.Edges() + neighbour.Vertices():
+            keep.Add(obj.wrapped)
+
+    upgrader = ShapeUpgrade_UnifySameDomain(shape.wrapped, True, True, True)
+    upgrader.AllowInternalEdges(False)
+    upgrader.KeepShapes(keep)
+    upgrader.Build()
+    return Shape.cast(upgrader.Shape())
+
+
+def _clean_in_worker(data: bytes) -> bytes:
+    # the neighbours are sent back with the cleaned group to map their copies
+    # back to the shapes of the parent process
+    group, neighbours = _from_brep(data)
+    return _to_brep([_unify(group, list(neighbours)), neighbours])
+
+
+def _reshared(shape: Shape, copies: Sequence[Shape], originals: Sequence[Shape]):
+    """
+    Replaces in shape the faces, edges and vertices of copies by the ones
+    of originals, copies being read back from the BREP of originals
+    """
+    reshape = BRepTools_ReShape()
+    for copy, original in zip(copies, originals):
+        for kind in ("Faces", "Edges", "Vertices"):
+            for old, new in zip(getattr(copy, kind)(), getattr(original, kind)()):
+                reshape.Replace(old.wrapped, new.wrapped)
+    return Shape.cast(reshape.Apply(shape.wrapped))
+
+
+def _clean_fragments(
+    result: Compound, inputs: Sequence[Shape], processes: int = 1
+) -> Compound:
+    """
+    Cleans only the fragments modified by the builder, the fragments
+    that are one of the input shapes as they were given are kept as they
+    are. The modified fragments are cleaned in groups of fragments with
+    overlapping bounding boxes, in a pool of processes if processes > 1:
+    fragments sharing faces are in the same group, so the groups do not
+    share any topology. The edges and vertices the modified fragments share
+    with the kept ones are not removed, so the result stays conformal.
+    """
+    untouched = {leaf for shape in inputs for leaf in _leaves(shape)}
+    fragments = list(_leaves(result))
+    touched = [k for k, f in enumerate(fragments) if f not in untouched]
+    kept = [k for k, f in enumerate(fragments) if f in untouched]
+    components = [
+        [touched[i] for i in c]
+        for c in _overlap_components([fragments[k] for k in touched], CLUSTER_GAP)
+    ]
+    groups = [Compound.makeCompound([fragments[k] for k in c]) for c in components]
+
+    # the kept fragments next to each group
+    kept_boxes = _bounding_boxes([fragments[k] for k in kept], CLUSTER_GAP)
+    neighbours = []
+    for c in components:
+        near = _overlapping(kept_boxes, _bounding_boxes([fragments[k] for k in c], 0))
+        neighbours.append([fragments[k] for k, n in zip(kept, near) if n])
+
+    if processes > 1 and len(groups) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            cleaned = []
+            for data, near in zip(
+                executor.map(
+                    _clean_in_worker,
+                    [
+                        _to_brep([group, Compound.makeCompound(near)])
+                        for group, near in zip(groups, neighbours)
+                    ],
+                ),
+                neighbours,
+            ):
+                group, copies = _from_brep(data)
+                cleaned.append(list(_reshared(group, list(copies), near)))
+    else:
+        cleaned = [list(_unify(group, near)) for group, near in zip(groups, neighbours)]
+
+    # the cleaned fragments take the place of the fragments, in order
+    for c, group in zip(components, cleaned):
+        for k, fragment in zip(c, group):
+            fragments[k] = fragment
+    return Compound.makeCompound(fragments)
+
+
 def _fragment(
-    self, *toFragment: "Shape", glue: bool = False, tol: Optional[float] = None
-) -> "Shape":
+    self,
+    *toFragment: "Shape",
+    glue: Union[bool, str] = False,
+    tol: Optional[float] = None,
+    use_obb: bool = False,
+    parallel: bool = True,
+    nondestructive: bool = False,
+    cluster: bool = False,
+    processes: int = 1,
+    incremental: bool = False,
+    provenance: bool = False,
+    report: bool = False,
+) -> Union["Shape", Tuple]:
     """
     Fragment the positional arguments with this Shape.
 
     :param glue: Sets the glue option for the algorithm, which allows
-        increasing performance of the intersection of the input shapes
+        increasing performance of the intersection of the input shapes.
+        True or "shift" for shapes that only share (parts of) their faces,
+        "full" for shapes sharing whole faces or not touching at all,
+        "auto" to check the shapes and choose the mode (logged at the
+        INFO level)
     :param tol: Additional tolerance
+    :param use_obb: Use oriented bounding boxes to find the interfering
+        shapes, which filters more pairs of shapes that do not interfere
+        but takes longer to compute
+    :param parallel: Run the algorithm in parallel threads
+    :param nondestructive: Do not modify the input shapes (e.g. by
+        increasing their tolerance), at the price of copying them
+    :param cluster: Split the shapes in groups of shapes with overlapping
+        bounding boxes and fragment each group separately
+    :param processes: Number of processes fragmenting the groups
+        in parallel when cluster is True
+    :param incremental: This Shape is already fragmented, only its
+        fragments overlapping the positional arguments are fragmented
+        again with them, the others are kept as they are
+    :param provenance: Also return the Provenance of the fragments,
+        mapping the fragments to the inputs they come from
+    :param report: Also return the FragmentReport of the operation
+        (after the Provenance if both are requested)
+    :raises FragmentError: if the boolean builder fails
     """
 
-    fragment_op = BRepAlgoAPI_BuilderAlgo()
-    toFragment = tuple(self) + toFragment
-    arg = TopTools_ListOfShape()
-    for obj in toFragment:
-        arg.Append(obj.wrapped)
-    fragment_op.SetArguments(arg)
+    _check_glue(glue)
+    start = time.perf_counter()
+    fragment_report = FragmentReport()
 
-    if glue:
-        fragment_op.SetGlue(BOPAlgo_GlueEnum.BOPAlgo_GlueShift)
-    if tol:
-        fragment_op.SetFuzzyValue(tol)
+    # a compound is fragmented with its children, other shapes as a whole
+    fragments = tuple(self) if isinstance(self, Compound) else (self,)
+    options = dict(
+        glue=glue,
+        tol=tol,
+        use_obb=use_obb,
+        parallel=parallel,
+        nondestructive=nondestructive,
+    )
 
-    fragment_op.SetRunParallel(True)
-    fragment_op.Build()
+    if incremental:
+        los, sources = _fragment_incremental(
+            fragments, toFragment, options, cluster, processes, fragment_report
+        )
+    elif cluster:
+        los, sources = _fragment_clusters(
+            fragments + toFragment, options, processes, fragment_report
+        )
+    else:
+        los, sources = _fragment_shapes(
+            fragments + toFragment, report=fragment_report, **options
+        )
 
-    if not fragment_op.IsDone():
-        print("Fragment Error. fragment_op.IsDone() = ", fragment_op.IsDone())
+    result = Compound.makeCompound(los)
+    fragment_report.inputs = len(fragments) + len(toFragment)
+    fragment_report.outputs = len(los)
+    fragment_report.fuzzy_value = tol or 0.0
+    fragment_report.wall_time = time.perf_counter() - start
 
-    it = TopoDS_Iterator(fragment_op.Shape())
-    los = tuple()
-    while it.More():
-        los = los + (Shape.cast(it.Value()),)
-        it.Next()
-    return Compound.makeCompound(los)
+    extras: List = []
+    if provenance:
+        extras.append(Provenance(sources, fragment_report.inputs))
+    if report:
+        extras.append(fragment_report)
+    return (result, *extras) if extras else result
 
 
 # Patch the function(s) into the Compound class
@@ -64,9 +684,17 @@ cq.Solid._fragment = _fragment
 def fragment(
     self,
     toFragment: Optional[Union["Workplane", Solid, Compound]] = None,
-    clean: bool = True,
-    glue: bool = False,
+    clean: Union[bool, str] = True,
+    glue: Union[bool, str] = False,
     tol: Optional[float] = None,
+    use_obb: bool = False,
+    parallel: bool = True,
+    nondestructive: bool = False,
+    cluster: bool = False,
+    processes: int = 1,
+    incremental: bool = False,
+    provenance: bool = False,
+    report: bool = False,
 ) -> "Workplane":
     """
     Fragment all of the items on the stack of toFragment with the current tool.
@@ -74,13 +702,42 @@ def fragment(
 
     :param toFragment:
     :type toFragment: a solid object, or a CQ object having a solid,
-    :param boolean clean: call :py:meth:`clean` afterwards to have a clean shape (default True)
-    :param boolean glue: use a faster gluing mode for non-overlapping shapes (default False)
+    :param clean: call :py:meth:`clean` afterwards to have a clean shape (default True),
+        "scoped" to only clean the fragments modified by the builder, in groups of fragments
+        with overlapping bounding boxes
+    :type clean: boolean or string
+    :param glue: use a faster gluing mode for non-overlapping shapes (default False):
+        True or "shift" for shapes sharing parts of their faces, "full" for shapes sharing whole
+        faces or not touching, "auto" to check the shapes and choose the mode
+    :type glue: boolean or string
     :param float tol: tolerance value for fuzzy bool operation mode (default None)
-    :raises: ValueError if there is no solid to add to in the chain
+    :param boolean use_obb: use oriented bounding boxes to find the interfering shapes (default False)
+    :param boolean parallel: run the algorithm in parallel threads (default True)
+    :param boolean nondestructive: do not modify the input shapes (default False)
+    :param boolean cluster: fragment separately each group of solids with overlapping bounding boxes (default False)
+    :param int processes: number of processes fragmenting the groups in parallel when clustering,
+        and cleaning the groups of fragments in parallel with clean="scoped" (default 1)
+    :param boolean incremental: the current solid is already fragmented, only fragment again its
+        fragments overlapping toFragment (default False)
+    :param boolean provenance: set the `provenance` attribute of the returned object to the
+        Provenance of the fragments (default False). The inputs are the fragments of the current
+        solid (the children of a compound) followed by the items of toFragment.
+    :param boolean report: set the `report` attribute of the returned object to the
+        FragmentReport of the operation, with the timings of each phase including clean (default False)
+    :raises: ValueError if there is no solid to add to in the chain, or for an unknown clean
+        or glue value
+    :raises: FragmentError if the boolean builder fails
     :return: a CQ object with the resulting object selected
     """
 
+    _check_glue(glue)
+    if clean not in CLEAN_VALUES:
+        raise ValueError(
+            "Unknown clean mode {!r}, use one of {}".format(
+                clean, ", ".join(repr(value) for value in CLEAN_VALUES)
+            )
+        )
+
     # first collect all of the items together
     newS: List[Shape]
     if isinstance(toFragment, cq.Workplane):
@@ -97,18 +754,49 @@ def fragment(
     # now combine with existing solid, if there is one
     # look for parents to cut from
     solidRef = self._findType((Solid, Compound), searchStack=True, searchParents=True)
+    inputs = ([solidRef] if solidRef is not None else []) + newS
+    options = dict(
+        glue=glue,
+        tol=tol,
+        use_obb=use_obb,
+        parallel=parallel,
+        nondestructive=nondestructive,
+        cluster=cluster,
+        processes=processes,
+        incremental=incremental,
+    )
     if solidRef is not None:
-        r = solidRef._fragment(*newS, glue=glue, tol=tol)
+        r, origin, fragment_report = solidRef._fragment(
+            *newS, provenance=True, report=True, **options
+        )
     elif len(newS) > 1:
-        r = newS.pop(0)._fragment(*newS, glue=glue, tol=tol)
+        r, origin, fragment_report = newS.pop(0)._fragment(
+            *newS, provenance=True, report=True, **options
+        )
     else:
         r = newS[0]
+        origin = Provenance([[0] for _ in _leaves(r)], 1)
+        fragment_report = FragmentReport()
+        fragment_report.inputs = 1
+        fragment_report.outputs = len(origin.sources)
 
     if clean:
-        r = r.clean()
+        start = time.perf_counter()
+        if clean == "scoped":
+            r = _clean_fragments(r, inputs, processes)
+        else:
+            r = r.clean()
+        fragment_report.timings["clean"] = time.perf_counter() - start
+        fragment_report.wall_time += fragment_report.timings["clean"]
 
-    # Use CQ eachpoint utility method to iterate over the stack and position the cubes
-    return self.eachpoint(lambda loc: r.located(loc), True)
+    # Use CQ eachpoint utility method to iterate over the stack and position the cubes,
+    # without its own clean of the whole result
+    result = self.eachpoint(lambda loc: r.located(loc), True, clean=False)
+    if provenance:
+        result.provenance = origin
+    if report:
+        result.report = fragment_report
+    return result
 
 
 # Patch the function(s) into the Workplane class
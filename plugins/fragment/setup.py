@@ -12,7 +12,7 @@ author = "Bruno Agostini"
 author_email = "bragostin@bluewin.ch"
 packages = []
 py_modules = ["fragment"]
-install_requires = []
+install_requires = ["numpy"]
 
 
 setup(
@@ -1,8 +1,31 @@
 import cadquery as cq
+import csv
+import json
+import os
 from collections import namedtuple
-from typing import Tuple, Optional, Union
+from functools import lru_cache
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 from numbers import Real
 
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+from OCP.BRepAlgoAPI import BRepAlgoAPI_Cut
+from OCP.TopTools import TopTools_ListOfShape
+
+# number of distinct heatsert tool solids kept in memory
+TOOL_CACHE_SIZE = 32
+# length units of the catalogs, in mm
+UNITS = {"mm": 1.0, "in": 25.4}
+# first line of the tool library files
+TOOL_LIBRARY_HEADER = b"cadquery-heatserts-tools 1\n"
+
 dims = namedtuple("dims", ["diam", "depth", "bolt_diam"])
 
 heatsert_dims = {
@@ -12,54 +35,293 @@ heatsert_dims = {
     "M3": dims(diam=4.0, depth=5.8, bolt_diam=3),
 }
 
+# default bolt_clear and chamfer of the sizes loaded from catalogs
+heatsert_defaults: Dict[str, Dict[str, Any]] = {}
+
+# tool solids loaded from a tool library, by _tool_key
+_tool_library: Dict[tuple, cq.Shape] = {}
+
+
+def _read_catalog(path: str) -> List[Dict[str, Any]]:
+    """
+    Returns the inserts of a CSV, JSON or TOML catalog as dicts
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            # DictReader puts the values beyond the header under None
+            if None in row:
+                raise ValueError(
+                    "Heatsert catalog entry {} has extra values".format(row)
+                )
+        return [
+            {k.strip(): v.strip() for k, v in row.items() if v and v.strip()}
+            for row in rows
+        ]
+
+    if ext == ".json":
+        with open(path) as f:
+            data = json.load(f)
+    elif ext == ".toml":
+        if tomllib is None:
+            raise ImportError("Loading TOML catalogs requires Python 3.11 or tomli")
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    else:
+        raise ValueError("Unknown heatsert catalog format '{}'".format(ext))
+
+    if isinstance(data, list):
+        return data
+    # the other top level values are defaults for all the inserts
+    common = {k: v for k, v in data.items() if k != "inserts"}
+    return [{**common, **row} for row in data.get("inserts", [])]
+
+
+def _catalog_entry(
+    row: Dict[str, Any], vendor: Optional[str]
+) -> Tuple[str, dims, Dict[str, Any]]:
+    """
+    Returns the name, dims and defaults of an insert of a catalog, in mm
+    """
+    try:
+        units = row.get("units", "mm")
+        scale = UNITS[units]
+    except KeyError:
+        raise ValueError("Unknown heatsert catalog units '{}'".format(units))
+
+    def length(value):
+        return float(value) * scale
+
+    try:
+        size = str(row["size"])
+        entry = dims(
+            diam=length(row["diam"]),
+            depth=length(row["depth"]),
+            bolt_diam=length(row["bolt_diam"]),
+        )
+    except KeyError as e:
+        raise ValueError("Heatsert catalog entry {} misses {}".format(row, e))
+
+    defaults: Dict[str, Any] = {}
+    if "bolt_clear" in row:
+        defaults["bolt_clear"] = length(row["bolt_clear"])
+    if "chamfer" in row:
+        chamfer = row["chamfer"]
+        if isinstance(chamfer, (list, tuple)):
+            defaults["chamfer"] = tuple(length(c) for c in chamfer)
+        else:
+            defaults["chamfer"] = (
+                length(chamfer),
+                length(row.get("chamfer_depth", chamfer)),
+            )
+
+    vendor = row.get("vendor", vendor)
+    name = "{}/{}".format(vendor, size) if vendor else size
+    return name, entry, defaults
+
+
+def load_catalog(path: str, vendor: Optional[str] = None) -> Dict[str, dims]:
+    """
+    Loads a catalog of heatserts from a CSV, JSON or TOML file, adds its
+    sizes to heatsert_dims and their default bolt_clear and chamfer to
+    heatsert_defaults, and returns the added sizes.
+
+    Each insert has a size, diam, depth and bolt_diam, and optionally a
+    vendor, units ("mm", the default, or "in"), bolt_clear, chamfer and
+    chamfer_depth. In JSON and TOML files the inserts are listed under
+    "inserts" and the other top level values apply to all of them.
+    The inserts of a vendor are named "vendor/size".
+
+    :param path: Path of the catalog, its extension gives the format
+    :param vendor: Vendor of the inserts that do not have one
+    """
+    added = {}
+    for row in _read_catalog(path):
+        name, entry, defaults = _catalog_entry(row, vendor)
+        added[name] = entry
+        heatsert_dims[name] = entry
+        if defaults:
+            heatsert_defaults[name] = defaults
+        else:
+            heatsert_defaults.pop(name, None)
+    return added
+
+
+@lru_cache(maxsize=TOOL_CACHE_SIZE)
+def _heatsert_tool(
+    diam: float,
+    depth: float,
+    bolt_diam: float,
+    bolt_clear: float,
+    chamfer_vals: Optional[Tuple[float, float]],
+) -> cq.Solid:
+    """
+    Returns the solid cut by a heatsert hole at the origin, boring along -Z.
+    The solid is cached, place copies of it with moved.
+    """
+    pnt = cq.Vector(0, 0, 0)
+    boreDir = cq.Vector(0, 0, -1)
+
+    hole = cq.Solid.makeCylinder(diam / 2.0, depth, pnt, boreDir)
+
+    if bolt_clear:
+        extra_hole_diam = bolt_diam * 1.2
+        extra_hole = cq.Solid.makeCylinder(
+            extra_hole_diam / 2.0, bolt_clear, pnt, boreDir
+        )
+        hole = hole.fuse(extra_hole)
+
+    if chamfer_vals:
+        cone_face_radius = diam / 2 + chamfer_vals[0]
+        cone = cq.Solid.makeCone(
+            cone_face_radius, diam / 2, chamfer_vals[1], pnt, boreDir
+        )
+        hole = hole.fuse(cone)
+
+    # merge the faces split by the fuses, every hole is cut with this tool
+    return hole.clean()
+
+
+def _tool_key(
+    size: str,
+    bolt_clear: Optional[float],
+    chamfer: Optional[Union[float, Tuple[float, float]]],
+) -> tuple:
+    """
+    Returns the dimensions of the tool of a heatsert, the size defaults
+    replacing the options left to None
+    """
+    diam, depth, bolt_diam = heatsert_dims[size]
+    defaults = heatsert_defaults.get(size, {})
+    if bolt_clear is None:
+        bolt_clear = defaults.get("bolt_clear", 0)
+    if chamfer is None:
+        chamfer = defaults.get("chamfer")
+
+    if not chamfer:
+        chamfer_vals = None
+    elif isinstance(chamfer, Real):
+        chamfer_vals = (chamfer, chamfer)
+    else:
+        chamfer_vals = tuple(chamfer)
+
+    return diam, depth, bolt_diam, bolt_clear, chamfer_vals
+
+
+def _get_tool(key: tuple) -> cq.Shape:
+    tool = _tool_library.get(key)
+    return tool if tool is not None else _heatsert_tool(*key)
+
+
+def save_tool_library(path: str, sizes: Optional[Sequence[str]] = None) -> int:
+    """
+    Builds the tool of each size of heatsert_dims, or of the given sizes,
+    with its default bolt_clear and chamfer, and writes all of them to one
+    binary BREP file. Returns the number of tools written.
+    """
+    keys = list(
+        dict.fromkeys(_tool_key(size, None, None) for size in sizes or heatsert_dims)
+    )
+    data = BytesIO()
+    cq.Compound.makeCompound([_get_tool(key) for key in keys]).exportBin(data)
+
+    with open(path, "wb") as f:
+        f.write(TOOL_LIBRARY_HEADER)
+        f.write(json.dumps(keys).encode() + b"\n")
+        f.write(data.getvalue())
+    return len(keys)
+
+
+def load_tool_library(path: str) -> int:
+    """
+    Reads the tools of a file written by save_tool_library, which are then
+    used instead of building them. Returns the number of tools read.
+    """
+    with open(path, "rb") as f:
+        if f.readline() != TOOL_LIBRARY_HEADER:
+            raise ValueError("{} is not a heatserts tool library".format(path))
+        keys = json.loads(f.readline())
+        tools = list(cq.Shape.importBin(BytesIO(f.read())))
+    if len(keys) != len(tools):
+        raise ValueError(
+            "{} lists {} tools but holds {}".format(path, len(keys), len(tools))
+        )
+
+    for key, tool in zip(keys, tools):
+        chamfer_vals = tuple(key[4]) if key[4] else None
+        _tool_library[(*key[:4], chamfer_vals)] = tool
+    return len(keys)
+
+
+def _cut_tools(
+    solid: cq.Shape, tools: Sequence[cq.Shape], tol: Optional[float] = None,
+) -> cq.Shape:
+    """
+    Cuts all the tools from the solid with a single boolean operation
+    """
+    cut_op = BRepAlgoAPI_Cut()
+
+    arg = TopTools_ListOfShape()
+    arg.Append(solid.wrapped)
+    tool = TopTools_ListOfShape()
+    for obj in tools:
+        tool.Append(obj.wrapped)
+    cut_op.SetArguments(arg)
+    cut_op.SetTools(tool)
+
+    if tol:
+        cut_op.SetFuzzyValue(tol)
+    cut_op.SetRunParallel(True)
+    cut_op.Build()
+
+    if not cut_op.IsDone():
+        raise ValueError("Cutting the heatsert holes failed")
+    return cq.Shape.cast(cut_op.Shape())
+
 
 def heatsert(
     self,
     size: str = "M6",
-    bolt_clear: float = 0,
+    bolt_clear: Optional[float] = None,
     chamfer: Optional[Union[float, Tuple[float, float]]] = None,
     clean: bool = True,
+    batched: bool = False,
+    tol: Optional[float] = None,
 ):
     """
     Creates a hole for a heatsert at each point on the stack.
 
-    :param size: What size heatsert the hole is intended for
-    :param bolt_clear: Allow clearance for this length of fastener below the surface
+    :param size: What size heatsert the hole is intended for, a key of heatsert_dims
+    :param bolt_clear: Allow clearance for this length of fastener below the surface. Defaults
+      to the value of the size in its catalog, or no clearance.
     :param chamfer: If a tuple of two floats, the first value is the setback on the face of your
       part (added to the diameter) and the second is the depth of the chamfer. If one value then
-      it is both the setback and the depth (ie. a 45 degree chamfer).
+      it is both the setback and the depth (ie. a 45 degree chamfer). Defaults to the value of
+      the size in its catalog, or no chamfer, use 0 for no chamfer.
     :param clean: Passed through to Workplane.cutEach
+    :param batched: Cut all the holes with a single boolean operation and clean the result
+      once, instead of going through Workplane.cutEach
+    :param tol: Fuzzy tolerance of the boolean operation, only used if batched is True
     """
-    diam, depth, bolt_diam = heatsert_dims[size]
-
-    if isinstance(chamfer, Real):
-        chamfer_vals = (chamfer, chamfer)
-    else:
-        chamfer_vals = chamfer
+    # the tool is built once for all the points, and for later calls with the same dims
+    tool = _get_tool(_tool_key(size, bolt_clear, chamfer))
 
     def _one_heatsert(loc):
-        pnt = cq.Vector(0, 0, 0)
-        boreDir = cq.Vector(0, 0, -1)
-
-        hole = cq.Solid.makeCylinder(diam / 2.0, depth, pnt, boreDir)
-
-        if bolt_clear:
-            extra_hole_diam = bolt_diam * 1.2
-            extra_hole = cq.Solid.makeCylinder(
-                extra_hole_diam / 2.0, bolt_clear, pnt, boreDir
-            )
-            hole = hole.fuse(extra_hole)
-
-        if chamfer:
-            cone_face_radius = diam / 2 + chamfer_vals[0]
-            cone = cq.Solid.makeCone(
-                cone_face_radius, diam / 2, chamfer_vals[1], pnt, boreDir
-            )
-            hole = hole.fuse(cone)
+        # distinct copies of the tool: the boolean operations add to the edges
+        # of the tools, and are much slower with tools sharing their topology
+        return tool.copy().moved(loc)
 
-        return hole.move(loc)
+    if not batched:
+        return self.cutEach(_one_heatsert, True, clean)
 
-    return self.cutEach(_one_heatsert, True, clean)
+    solid = self.findSolid()
+    tools = self.eachpoint(_one_heatsert, True, clean=False).vals()
+    result = _cut_tools(solid, tools, tol)
+    if clean:
+        result = result.clean()
+    return self.newObject([result])
 
 
 # Patch the function into the Workplane class
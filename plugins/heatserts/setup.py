@@ -9,9 +9,9 @@ author = "Marcus Boyd"
 author_email = "marcus7070@github"
 packages = []  # List of packages that will be installed with this plugin
 py_modules = ["heatserts"]  # Put the name of your plugin's .py file here
-install_requires = (
-    []
-)  # Any dependencies that pip also needs to install to make this plugin work
+install_requires = [
+    'tomli; python_version < "3.11"'
+]  # Any dependencies that pip also needs to install to make this plugin work
 
 
 setup(
@@ -1,6 +1,14 @@
 import cadquery as cq
+import numpy as np
+import re
+
+from contextvars import ContextVar
+from functools import lru_cache, reduce
+from threading import RLock
 
 from cadquery.occ_impl.geom import Vector
+from OCP.BRepGProp import BRepGProp
+from OCP.GProp import GProp_GProps
 from cadquery.occ_impl.shape_protocols import (
     geom_LUT_EDGE,
     geom_LUT_FACE,
@@ -19,6 +27,16 @@ from pyparsing import (
     opAssoc,
 )
 
+PARSE_CACHE_SIZE = 256
+SELECTOR_CACHE_SIZE = 1024
+LOCAL_DIRECTIONS = ("x", "y", "z", "xy", "yz", "xz")
+# expression using every parse action of the expression grammar
+WARM_UP_EXPRESSION = "not >x and <y or |z exc #x"
+# once the exc/except operators are removed, only expressions using
+# lowercase axes (or lowercase geometry types) contain these characters
+_EXC_OPERATOR = re.compile(r"\bexc(ept)?\b")
+_LOCAL_AXIS_CHARACTERS = frozenset("xyz")
+
 
 def _makeGrammar():
     """
@@ -85,47 +103,448 @@ def _makeGrammar():
     )
 
 
+class _Node:
+    """
+    Node of a parsed string selector expression. Atoms keep the parse
+    results of a simple selector, the other nodes are the logical
+    operations applied to their children.
+    """
+
+    def __init__(self, op, items):
+        self.op = op
+        self.items = items
+
+    def uses_local_axes(self):
+        if self.op == "atom":
+            return (
+                "simple_dir" in self.items and self.items.simple_dir in LOCAL_DIRECTIONS
+            )
+        return any(item.uses_local_axes() for item in self.items)
+
+
+def _makeTreeGrammar(atom):
+    """
+    Define the complex string selector grammar like
+    cq.selectors._makeExpressionGrammar, but the parser builds a tree of
+    _Node that does not depend on the local axes instead of selector objects
+    """
+
+    and_op = Literal("and")
+    or_op = Literal("or")
+    delta_op = oneOf(["exc", "except"])
+    not_op = Literal("not")
+
+    atom.set_parse_action(lambda res: _Node("atom", res))
+
+    def binary_callback(op):
+        # take every second items, i.e. all operands
+        return lambda res: _Node(op, res.as_list()[0][::2])
+
+    def not_callback(res):
+        return _Node("not", res.as_list()[0][1:])
+
+    return infixNotation(
+        atom,
+        [
+            (and_op, 2, opAssoc.LEFT, binary_callback("and")),
+            (or_op, 2, opAssoc.LEFT, binary_callback("or")),
+            (delta_op, 2, opAssoc.LEFT, binary_callback("exc")),
+            (not_op, 1, opAssoc.RIGHT, not_callback),
+        ],
+    )
+
+
+_binary_selectors = {
+    "and": cq.selectors.AndSelector,
+    "or": cq.selectors.SumSelector,
+    "exc": cq.selectors.SubtractSelector,
+}
+
+
+def _make_local_axes(xDir, yDir, zDir):
+    return {
+        "x": xDir,
+        "y": yDir,
+        "z": zDir,
+        "xy": xDir + yDir,
+        "yz": yDir + zDir,
+        "xz": xDir + zDir,
+    }
+
+
+DEFAULT_LOCAL_AXES = _make_local_axes(Vector(1, 0, 0), Vector(0, 1, 0), Vector(0, 0, 1))
+
+# The local axes used by the string selectors built inside a LocalCoordinates
+# block. Being a context variable, each thread and each asyncio task sees its
+# own value.
+current_local_axes = ContextVar("local_axes", default=DEFAULT_LOCAL_AXES)
+
+
+_mass_calc_functions = {
+    cq.Edge: BRepGProp.LinearProperties_s,
+    cq.Face: BRepGProp.SurfaceProperties_s,
+}
+
+
+def _centers(objectList):
+    """
+    Returns the centers of the objects as a (n, 3) array.
+    Edges and faces call OCCT directly, which gives the same result as
+    Shape.Center without its overhead.
+    """
+    centers = np.empty((len(objectList), 3))
+    for i, o in enumerate(objectList):
+        calc_function = _mass_calc_functions.get(type(o))
+        if calc_function is None:
+            centers[i] = o.Center().toTuple()
+        else:
+            properties = GProp_GProps()
+            calc_function(o.wrapped, properties)
+            center = properties.CentreOfMass()
+            centers[i] = (center.X(), center.Y(), center.Z())
+    return centers
+
+
+def _directions(objectList):
+    """
+    Returns the indices of the planar faces and linear edges of objectList,
+    and their normal or tangent vectors as a (n, 3) array
+    """
+    indices = []
+    vectors = []
+    for i, o in enumerate(objectList):
+        if o.ShapeType() == "Face" and o.geomType() == "PLANE":
+            vec = o.normalAt(None)
+        elif o.ShapeType() == "Edge" and o.geomType() == "LINE":
+            vec = o.tangentAt()
+        else:
+            continue
+        indices.append(i)
+        vectors.append(vec.toTuple())
+    return (
+        np.array(indices, dtype=int),
+        np.array(vectors, dtype=float).reshape(-1, 3),
+    )
+
+
+class BatchedDirSelector(cq.Selector):
+    """
+    Equivalent of the cadquery DirectionSelector, ParallelDirSelector and
+    PerpendicularDirSelector (depending on `test`, which is one of "direction",
+    "parallel" and "perpendicular") testing all the normals and tangents
+    at once with array operations.
+    """
+
+    def __init__(self, vector, test, tolerance=0.0001):
+        self.direction = np.array(Vector(vector).toTuple())
+        self.test = test
+        self.tolerance = tolerance
+
+    def mask(self, vectors):
+        cross = np.linalg.norm(np.cross(self.direction, vectors), axis=1)
+        if self.test == "parallel":
+            return cross < self.tolerance
+        angles = np.arctan2(cross, vectors @ self.direction)
+        if self.test == "direction":
+            return angles < self.tolerance
+        return np.abs(angles - np.pi / 2) < self.tolerance
+
+    def filter(self, objectList):
+        indices, vectors = _directions(objectList)
+        return [objectList[i] for i in indices[self.mask(vectors)]]
+
+
+class BatchedCenterNthSelector(cq.Selector):
+    """
+    Equivalent of the cadquery CenterNthSelector (or DirectionNthSelector
+    when `parallel` is True) sorting and clustering the projected centers
+    of all the objects at once with array operations.
+    """
+
+    def __init__(self, vector, n, directionMax=True, tolerance=0.0001, parallel=False):
+        self.direction = np.array(Vector(vector).toTuple())
+        self.n = n
+        self.directionMax = directionMax
+        self.tolerance = tolerance
+        self.parallel = (
+            BatchedDirSelector(vector, "parallel", tolerance) if parallel else None
+        )
+
+    def cluster(self, keys):
+        """
+        Returns the order of the keys and the (start, end) bounds of the
+        clusters of keys within tolerance in that order
+        """
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = [0]
+        while True:
+            end = np.searchsorted(
+                sorted_keys, sorted_keys[starts[-1]] + self.tolerance, side="right"
+            )
+            if end >= len(sorted_keys):
+                break
+            starts.append(int(end))
+        return order, list(zip(starts, starts[1:] + [len(sorted_keys)]))
+
+    def filter(self, objectList):
+        if self.parallel is not None:
+            objectList = self.parallel.filter(objectList)
+
+        if len(objectList) == 0:
+            # nothing to filter
+            raise ValueError("Can not return the Nth element of an empty list")
+
+        order, clusters = self.cluster(_centers(objectList) @ self.direction)
+        if not self.directionMax:
+            clusters.reverse()
+        try:
+            start, end = clusters[self.n]
+        except IndexError:
+            raise IndexError(
+                f"Attempted to access index {self.n} of a list with length {len(clusters)}"
+            )
+
+        return [objectList[i] for i in order[start:end]]
+
+
+_operator_min_max = {
+    ">": True,
+    ">>": True,
+    "<": False,
+    "<<": False,
+}
+
+_other_operators = {
+    "+": lambda v: BatchedDirSelector(v, "direction"),
+    "-": lambda v: BatchedDirSelector(-v, "direction"),
+    "#": lambda v: BatchedDirSelector(v, "perpendicular"),
+    "|": lambda v: BatchedDirSelector(v, "parallel"),
+}
+
+
+def _compile_atom(pr):
+    """
+    Returns a function building the selector of a simple string selector
+    from the local axes, following _SimpleStringSyntaxSelector._chooseSelector.
+    The selectors using local axes are evaluated with array operations.
+    """
+    if not ("simple_dir" in pr and pr.simple_dir in LOCAL_DIRECTIONS):
+        selector = cq.selectors._SimpleStringSyntaxSelector(pr)
+        return lambda local_axes: selector
+
+    if "only_dir" in pr:
+        make = _other_operators["+"]
+
+    elif "dir_op" in pr:
+        minmax = _operator_min_max[pr.dir_op]
+        if "index" in pr:
+            n = int("".join(pr.index.as_list()))
+            make = lambda v: BatchedCenterNthSelector(v, n, minmax, parallel=True)
+        else:
+            make = lambda v: BatchedCenterNthSelector(v, -1, minmax)
+
+    elif "center_nth_op" in pr:
+        minmax = _operator_min_max[pr.center_nth_op]
+        n = int("".join(pr.index.as_list())) if "index" in pr else -1
+        make = lambda v: BatchedCenterNthSelector(v, n, minmax)
+
+    else:
+        make = _other_operators[pr.other_op]
+
+    symbol = pr.simple_dir
+    return lambda local_axes: make(local_axes[symbol])
+
+
+def _compile(node):
+    """
+    Returns a function building the selector object of a parsed expression
+    from the local axes
+    """
+    if node.op == "atom":
+        return _compile_atom(node.items)
+    items = [_compile(item) for item in node.items]
+    if node.op == "not":
+        return lambda local_axes: cq.selectors.InverseSelector(items[0](local_axes))
+    binary_selector = _binary_selectors[node.op]
+    return lambda local_axes: reduce(
+        binary_selector, [item(local_axes) for item in items]
+    )
+
+
+class CompiledSelector(cq.Selector):
+    """
+    A string selector parsed once and kept in symbolic form, with the
+    lowercase axes resolved each time the selector is bound to a plane.
+
+    Passed to a Workplane selection method, it uses the axes of the workplane
+    plane, so the same compiled selector can be reused on any number of planes::
+
+        top = compile_selector(">z")
+        for face in faces:
+            wp = cq.Workplane(planes[face]).add(face).faces(top)
+
+    Used directly, or combined with other selectors, it uses the axes of the
+    current LocalCoordinates block (or the global axes).
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        tree = _parse(expression)
+        self.uses_local_axes = tree.uses_local_axes()
+        self._make = _compile(tree)
+        self._selector = (
+            None if self.uses_local_axes else self._make(DEFAULT_LOCAL_AXES)
+        )
+
+    def bind_axes(self, local_axes):
+        """
+        Returns the selector object for the given local axes dictionary
+        """
+        if self._selector is not None:
+            return self._selector
+        return self._make(local_axes)
+
+    def bind(self, plane):
+        """
+        Returns the selector object with the lowercase axes being the axes of plane
+        """
+        if self._selector is not None:
+            return self._selector
+        return self._make(_make_local_axes(plane.xDir, plane.yDir, plane.zDir))
+
+    def filter(self, objectList):
+        return self.bind_axes(current_local_axes.get()).filter(objectList)
+
+
+def _may_use_local_axes(selector):
+    """
+    Quick test telling whether a string selector can contain lowercase axes
+    without parsing it. It can return True for expressions that do not use
+    them, but never returns False for expressions that do.
+    """
+    return not _LOCAL_AXIS_CHARACTERS.isdisjoint(_EXC_OPERATOR.sub("", selector))
+
+
+def _install_grammars():
+    """
+    Builds the grammars understanding the lowercase axes and patches the
+    cadquery string selector grammar with them, on the first use of a
+    lowercase axis. Must be called with _parse_lock held.
+    """
+    global _tree_grammar
+    if _tree_grammar is not None:
+        return _tree_grammar
+
+    cq.selectors._grammar = _makeGrammar()  # make a grammar instance
+    cq.selectors._expression_grammar = cq.selectors._makeExpressionGrammar(
+        cq.selectors._grammar
+    )
+    # pyparsing finds the number of arguments of each parse action the first
+    # time it is called, which is not thread safe, so do it now
+    cq.selectors._expression_grammar.parse_string(WARM_UP_EXPRESSION)
+
+    _tree_grammar = _makeTreeGrammar(_makeGrammar())
+    return _tree_grammar
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse(selector):
+    """
+    Parses a string selector, the result is cached by expression
+    """
+    # pyparsing parsers are not thread safe
+    with _parse_lock:
+        return _install_grammars().parse_string(selector, parse_all=True)[0]
+
+
+def _axes_key(plane):
+    return (plane.xDir.toTuple(), plane.yDir.toTuple(), plane.zDir.toTuple())
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def compile_selector(expression):
+    """
+    Returns the CompiledSelector of a string selector expression, cached by expression
+    """
+    return CompiledSelector(expression)
+
+
+@lru_cache(maxsize=SELECTOR_CACHE_SIZE)
+def _cached_selector(selector, axes):
+    if not _may_use_local_axes(selector):
+        # no need for the lowercase axes grammars
+        with _parse_lock:
+            return cq.selectors.StringSyntaxSelector(selector)
+    compiled = compile_selector(selector)
+    if axes is None:
+        return compiled.bind_axes(DEFAULT_LOCAL_AXES)
+    return compiled.bind_axes(_make_local_axes(*(Vector(*v) for v in axes)))
+
+
+def string_selector(selector, plane):
+    """
+    Returns the selector object of a string selector expression with the
+    lowercase axes being the axes of plane.
+
+    Both the parsed expression and the selector object are cached, so
+    repeated selections with the same expression do not run the parser.
+    """
+    if _may_use_local_axes(selector) and _parse(selector).uses_local_axes():
+        return _cached_selector(selector, _axes_key(plane))
+    return _cached_selector(selector, None)
+
+
 old_getVector = cq.selectors._SimpleStringSyntaxSelector._getVector
 
 
 def _getVector(self, pr):
-    if (
-        "simple_dir" in pr
-        and pr.simple_dir in cq.selectors._SimpleStringSyntaxSelector.local_axes
-    ):
-        return cq.selectors._SimpleStringSyntaxSelector.local_axes[pr.simple_dir]
+    axes = current_local_axes.get()
+    if "simple_dir" in pr and pr.simple_dir in axes:
+        return axes[pr.simple_dir]
     else:
         return old_getVector(self, pr)
 
 
+old_StringSyntaxSelector_init = cq.selectors.StringSyntaxSelector.__init__
+
+
+def _StringSyntaxSelector_init(self, selectorString):
+    # the string is parsed by the shared cadquery grammar, which is not
+    # thread safe either
+    with _parse_lock:
+        if _may_use_local_axes(selectorString):
+            _install_grammars()
+        old_StringSyntaxSelector_init(self, selectorString)
+
+
 class LocalCoordinates:
+    """
+    Context manager making the lowercase axes of the string selectors
+    built inside it the axes of plane. It only affects the current
+    thread or asyncio task.
+    """
+
     def __init__(self, plane):
         self.plane = plane
-        self.old_axes = None
+        self.token = None
 
     def __enter__(self):
-        self.old_axes, cq.selectors._SimpleStringSyntaxSelector.local_axes = (
-            cq.selectors._SimpleStringSyntaxSelector.local_axes,
-            {
-                "x": self.plane.xDir,
-                "y": self.plane.yDir,
-                "z": self.plane.zDir,
-                "xy": self.plane.xDir + self.plane.yDir,
-                "yz": self.plane.yDir + self.plane.zDir,
-                "xz": self.plane.xDir + self.plane.zDir,
-            },
+        self.token = current_local_axes.set(
+            _make_local_axes(self.plane.xDir, self.plane.yDir, self.plane.zDir)
         )
 
     def __exit__(self, _exc_type, _exc_value, _traceback):
-        cq.selectors._SimpleStringSyntaxSelector.local_axes = self.old_axes
+        current_local_axes.reset(self.token)
 
 
 def _filter(self, objs, selector):
     selectorObj: Selector
     if selector:
         if isinstance(selector, str):
-            with LocalCoordinates(self.plane):
-                selectorObj = cq.selectors.StringSyntaxSelector(selector)
+            selectorObj = string_selector(selector, self.plane)
+        elif isinstance(selector, CompiledSelector):
+            selectorObj = selector.bind(self.plane)
         else:
             selectorObj = selector
         toReturn = selectorObj.filter(objs)
@@ -135,19 +554,11 @@ def _filter(self, objs, selector):
     return toReturn
 
 
-cq.selectors._SimpleStringSyntaxSelector.local_axes = {
-    "x": Vector(1, 0, 0),
-    "y": Vector(0, 1, 0),
-    "z": Vector(0, 0, 1),
-    "xy": Vector(1, 1, 0),
-    "yz": Vector(0, 1, 1),
-    "xz": Vector(1, 0, 1),
-}
 cq.selectors._SimpleStringSyntaxSelector._getVector = _getVector
+cq.selectors.StringSyntaxSelector.__init__ = _StringSyntaxSelector_init
 
-cq.selectors._grammar = _makeGrammar()  # make a grammar instance
-cq.selectors._expression_grammar = cq.selectors._makeExpressionGrammar(
-    cq.selectors._grammar
-)
+# the grammars are built by _install_grammars on the first use of a lowercase axis
+_tree_grammar = None
+_parse_lock = RLock()
 
 cq.Workplane._filter = _filter
@@ -11,9 +11,9 @@ author = "Kelvin Ly"
 author_email = "cactorium"
 packages = []  # List of packages that will be installed with this plugin
 py_modules = ["localselectors"]  # Put the name of your plugin's .py file here
-install_requires = (
-    []
-)  # Any dependencies that pip also needs to install to make this plugin work
+install_requires = [
+    "numpy"
+]  # Any dependencies that pip also needs to install to make this plugin work
 
 
 setup(
@@ -1,8 +1,17 @@
 from .main import (
+    RegionSelector,
     InfiniteCylinderSelector,
     InfHollowCylinderSelector,
     CylinderSelector,
     HollowCylinderSelector,
     SphereSelector,
     HollowSphereSelector,
+    OrientedBoxSelector,
+    SlabSelector,
+    ConeSelector,
+    CompositeSelector,
+    UnionSelector,
+    IntersectionSelector,
+    DifferenceSelector,
+    ComplementSelector,
 )
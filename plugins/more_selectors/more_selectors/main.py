@@ -1,22 +1,30 @@
 import cadquery as cq
-from math import sqrt
+import numpy as np
+from abc import ABC, abstractmethod
 from . import utils
 
 
-class InfiniteCylinderSelector(cq.Selector):
+class RegionSelector(cq.Selector, ABC):
     """
-    Selects any shape present in the defined infinite cylinder
-    based on the shape center of mass point.
+    Base class of the selectors defined by a region of space.
+
+    Subclasses implement `mask` which tells, for an array of points,
+    which ones lie inside the region. The centers of the shapes are
+    computed once per call to `filter` and every region is evaluated
+    on the whole array at once.
+
+    Region selectors can be combined with the usual selector operators
+    (`+`, `&`, `-` and unary `-`), the result being a `CompositeSelector`
+    evaluated in a single pass over the shapes.
 
+    With `debug=True` the region is shown in the viewer (if there is one)
+    the first time the selector is used. The debug geometry is only built
+    at that time and is cached by the selector parameters.
     """
 
-    def __init__(self, origin, along_axis, radius, debug=False):
-        self.outer_radius = radius
-        self.axis = self.get_axis(along_axis)
-        xdir = self.get_ortho_vector(self.axis)
-        self.base = cq.Plane(cq.Vector(origin), xdir, self.axis.toTuple())
-        if debug:
-            utils.make_debug_cylinder(self.base, self.outer_radius)
+    debug = False
+    debug_name = "selection region"
+    _debug_shown = False
 
     def get_axis(self, axis_value):
         named_vectors = {
@@ -52,17 +60,92 @@ class InfiniteCylinderSelector(cq.Selector):
             else:
                 return (1, 1, (-vector.x - vector.y) / vector.z)
 
+    def radius_and_height(self, points):
+        """
+        Returns the distances of the (n, 3) `points` to the axis of the
+        `base` plane of the region and their heights along it
+        """
+        local = utils.to_local_coords(points, self.base)
+        return np.hypot(local[:, 0], local[:, 1]), local[:, 2]
+
+    @abstractmethod
+    def mask(self, points):
+        """
+        Returns a boolean array telling which of the (n, 3) `points`
+        are inside the region
+        """
+        pass
+
+    @abstractmethod
+    def debug_shape(self, points):
+        """
+        Returns a Workplane holding the region, sized to cover the
+        (n, 3) `points` if the region is infinite
+        """
+        pass
+
+    def show_debug(self, points):
+        if not self.debug or self._debug_shown:
+            return
+        viewer = utils.get_viewer()
+        if viewer is None:
+            return
+        viewer(
+            self.debug_shape(points), name=self.debug_name, options=utils.DEBUG_OPTIONS
+        )
+        self._debug_shown = True
+
     def filter(self, objectList):
-        result = []
-        for o in objectList:
-            p = o.Center()
-            projected_p = self.base.toLocalCoords(p)
-            p_radius = sqrt(projected_p.x ** 2 + projected_p.y ** 2)
+        centers = utils.get_centers(objectList)
+        self.show_debug(centers)
+        inside = self.mask(centers)
+        return [o for o, keep in zip(objectList, inside) if keep]
+
+    def __add__(self, other):
+        if isinstance(other, RegionSelector):
+            return UnionSelector(self, other)
+        return super().__add__(other)
+
+    def __and__(self, other):
+        if isinstance(other, RegionSelector):
+            return IntersectionSelector(self, other)
+        return super().__and__(other)
 
-            if p_radius < self.outer_radius:
-                result.append(o)
+    def __sub__(self, other):
+        if isinstance(other, RegionSelector):
+            return DifferenceSelector(self, other)
+        return super().__sub__(other)
 
-        return result
+    def __neg__(self):
+        return ComplementSelector(self)
+
+
+class InfiniteCylinderSelector(RegionSelector):
+    """
+    Selects any shape present in the defined infinite cylinder
+    based on the shape center of mass point.
+
+    """
+
+    debug_name = "selection cylinder"
+
+    def __init__(self, origin, along_axis, radius, debug=False):
+        self.outer_radius = radius
+        self.axis = self.get_axis(along_axis)
+        xdir = self.get_ortho_vector(self.axis)
+        self.base = cq.Plane(cq.Vector(origin), xdir, self.axis.toTuple())
+        self.debug = debug
+
+    def debug_shape(self, points):
+        return utils.make_debug_cylinder(
+            utils.plane_key(self.base),
+            self.outer_radius,
+            length=utils.bounded_length(points, self.base.origin.toTuple()),
+        )
+
+    def mask(self, points):
+        p_radius, _ = self.radius_and_height(points)
+        return p_radius < self.outer_radius
 
 
 class InfHollowCylinderSelector(InfiniteCylinderSelector):
@@ -74,23 +157,20 @@ class InfHollowCylinderSelector(InfiniteCylinderSelector):
     def __init__(self, origin, along_axis, outer_radius, inner_radius, debug=False):
         if outer_radius < inner_radius:
             raise ValueError("outer_radius must be greater than inner_radius")
-        super().__init__(origin, along_axis, outer_radius, debug=False)
+        super().__init__(origin, along_axis, outer_radius, debug=debug)
         self.inner_radius = inner_radius
-        if debug:
-            utils.make_debug_cylinder(
-                self.base, self.outer_radius, inner_radius=self.inner_radius
-            )
 
-    def filter(self, objectList):
-        result = []
-        for o in objectList:
-            p = o.Center()
-            projected_p = self.base.toLocalCoords(p)
-            p_radius = sqrt(projected_p.x ** 2 + projected_p.y ** 2)
+    def debug_shape(self, points):
+        return utils.make_debug_cylinder(
+            utils.plane_key(self.base),
+            self.outer_radius,
+            inner_radius=self.inner_radius,
+            length=utils.bounded_length(points, self.base.origin.toTuple()),
+        )
 
-            if p_radius < self.outer_radius and p_radius > self.inner_radius:
-                result.append(o)
-        return result
+    def mask(self, points):
+        p_radius, _ = self.radius_and_height(points)
+        return (p_radius < self.outer_radius) & (p_radius > self.inner_radius)
 
 
 class CylinderSelector(InfiniteCylinderSelector):
@@ -100,23 +180,19 @@ class CylinderSelector(InfiniteCylinderSelector):
     """
 
     def __init__(self, origin, along_axis, height, radius, debug=False):
-        super().__init__(origin, along_axis, radius)
+        super().__init__(origin, along_axis, radius, debug=debug)
         self.height = height
-        if debug:
-            utils.make_debug_cylinder(self.base, radius, height=height)
 
-    def filter(self, objectList):
-        result = []
-        for o in objectList:
-            p = o.Center()
-            projected_p = self.base.toLocalCoords(p)
-            p_radius = sqrt(projected_p.x ** 2 + projected_p.y ** 2)
+    def debug_shape(self, points):
+        return utils.make_debug_cylinder(
+            utils.plane_key(self.base), self.outer_radius, height=self.height
+        )
 
-            if p_radius < self.outer_radius and (
-                projected_p.z < self.height and projected_p.z > 0
-            ):
-                result.append(o)
-        return result
+    def mask(self, points):
+        p_radius, p_height = self.radius_and_height(points)
+        return (
+            (p_radius < self.outer_radius) & (p_height < self.height) & (p_height > 0)
+        )
 
 
 class HollowCylinderSelector(InfHollowCylinderSelector):
@@ -128,51 +204,48 @@ class HollowCylinderSelector(InfHollowCylinderSelector):
     def __init__(
         self, origin, along_axis, height, outer_radius, inner_radius, debug=False
     ):
-        super().__init__(origin, along_axis, outer_radius, inner_radius)
+        super().__init__(origin, along_axis, outer_radius, inner_radius, debug=debug)
         self.height = height
-        if debug:
-            utils.make_debug_cylinder(
-                self.base, outer_radius, inner_radius=inner_radius, height=height
-            )
-
-    def filter(self, objectList):
-        result = []
-        for o in objectList:
-            p = o.Center()
-            projected_p = self.base.toLocalCoords(p)
-            p_radius = sqrt(projected_p.x ** 2 + projected_p.y ** 2)
-
-            if (p_radius < self.outer_radius and p_radius > self.inner_radius) and (
-                projected_p.z < self.height and projected_p.z > 0
-            ):
-                result.append(o)
-        return result
 
-
-class SphereSelector(cq.Selector):
+    def debug_shape(self, points):
+        return utils.make_debug_cylinder(
+            utils.plane_key(self.base),
+            self.outer_radius,
+            inner_radius=self.inner_radius,
+            height=self.height,
+        )
+
+    def mask(self, points):
+        p_radius, p_height = self.radius_and_height(points)
+        return (
+            (p_radius < self.outer_radius)
+            & (p_radius > self.inner_radius)
+            & (p_height < self.height)
+            & (p_height > 0)
+        )
+
+
+class SphereSelector(RegionSelector):
     """
     Selects any shape present in the defined sphere
     based on the shape center of mass point.
     """
 
+    debug_name = "selection sphere"
+
     def __init__(self, origin, radius, debug=False):
         self.origin = cq.Vector(origin)
         self.outer_radius = radius
-        if debug:
-            utils.make_debug_sphere(origin, radius)
+        self.debug = debug
 
-    def filter(self, objectList):
-        result = []
-        for o in objectList:
-            p = o.Center()
-            projected_p = p - self.origin
-            p_radius = sqrt(
-                projected_p.x ** 2 + projected_p.y ** 2 + projected_p.z ** 2
-            )
+    def debug_shape(self, points):
+        return utils.make_debug_sphere(self.origin.toTuple(), self.outer_radius)
+
+    def radius(self, points):
+        return np.linalg.norm(points - np.array(self.origin.toTuple()), axis=1)
 
-            if p_radius < self.outer_radius:
-                result.append(o)
-        return result
+    def mask(self, points):
+        return self.radius(points) < self.outer_radius
 
 
 class HollowSphereSelector(SphereSelector):
@@ -184,20 +257,235 @@ class HollowSphereSelector(SphereSelector):
     def __init__(self, origin, outer_radius, inner_radius, debug=False):
         if outer_radius < inner_radius:
             raise ValueError("outer_radius must be greater than inner_radius")
-        super().__init__(origin, outer_radius)
+        super().__init__(origin, outer_radius, debug=debug)
         self.inner_radius = inner_radius
-        if debug:
-            utils.make_debug_sphere(origin, outer_radius, inner_radius=inner_radius)
 
-    def filter(self, objectList):
-        result = []
-        for o in objectList:
-            p = o.Center()
-            projected_p = p - self.origin
-            p_radius = sqrt(
-                projected_p.x ** 2 + projected_p.y ** 2 + projected_p.z ** 2
-            )
-
-            if p_radius < self.outer_radius and p_radius > self.inner_radius:
-                result.append(o)
-        return result
+    def debug_shape(self, points):
+        return utils.make_debug_sphere(
+            self.origin.toTuple(), self.outer_radius, inner_radius=self.inner_radius
+        )
+
+    def mask(self, points):
+        p_radius = self.radius(points)
+        return (p_radius < self.outer_radius) & (p_radius > self.inner_radius)
+
+
+class OrientedBoxSelector(RegionSelector):
+    """
+    Selects any shape present in the defined box based on
+    the shape center of mass point.
+
+    The box is centered on `origin` in the plane normal to
+    `along_axis` and extends from `origin` over `height` along it.
+    `xdir` orients the `length` side of the box, it defaults to the
+    global X axis (or the global Y axis if `along_axis` is along X).
+    It is projected on the plane normal to `along_axis`.
+    """
+
+    debug_name = "selection box"
+
+    def __init__(
+        self, origin, along_axis, length, width, height, xdir=None, debug=False
+    ):
+        if min(length, width, height) <= 0:
+            raise ValueError("length, width and height must be positive")
+        self.axis = self.get_axis(along_axis)
+        if xdir is None:
+            xdir = cq.Vector(1, 0, 0)
+            if xdir.cross(self.axis).Length < 1e-9 * self.axis.Length:
+                xdir = cq.Vector(0, 1, 0)
+        else:
+            xdir = cq.Vector(xdir)
+            if xdir.cross(self.axis).Length <= 1e-9 * self.axis.Length * xdir.Length:
+                raise ValueError("xdir must not be null or parallel to along_axis")
+        xdir = xdir - self.axis.multiply(xdir.dot(self.axis) / self.axis.Length ** 2)
+        self.base = cq.Plane(cq.Vector(origin), xdir, self.axis.toTuple())
+        self.length = length
+        self.width = width
+        self.height = height
+        self.debug = debug
+
+    def debug_shape(self, points):
+        return utils.make_debug_box(
+            utils.plane_key(self.base), self.length, self.width, self.height
+        )
+
+    def mask(self, points):
+        local = utils.to_local_coords(points, self.base)
+        return (
+            (np.abs(local[:, 0]) < self.length / 2)
+            & (np.abs(local[:, 1]) < self.width / 2)
+            & (local[:, 2] < self.height)
+            & (local[:, 2] > 0)
+        )
+
+
+class SlabSelector(RegionSelector):
+    """
+    Selects any shape present between two parallel planes based on
+    the shape center of mass point.
+
+    The first plane goes through `origin` and the second one is offset
+    by `thickness` along `along_axis`.
+    """
+
+    debug_name = "selection slab"
+
+    def __init__(self, origin, along_axis, thickness, debug=False):
+        if thickness <= 0:
+            raise ValueError("thickness must be positive")
+        self.axis = self.get_axis(along_axis)
+        xdir = self.get_ortho_vector(self.axis)
+        self.base = cq.Plane(cq.Vector(origin), xdir, self.axis.toTuple())
+        self.thickness = thickness
+        self.debug = debug
+
+    def debug_shape(self, points):
+        return utils.make_debug_slab(
+            utils.plane_key(self.base),
+            self.thickness,
+            utils.bounded_length(points, self.base.origin.toTuple()),
+        )
+
+    def mask(self, points):
+        height = (points - np.array(self.base.origin.toTuple())) @ np.array(
+            self.base.zDir.toTuple()
+        )
+        return (height < self.thickness) & (height > 0)
+
+
+class ConeSelector(RegionSelector):
+    """
+    Selects any shape present in the defined (truncated) cone
+    based on the shape center of mass point.
+
+    The base of the cone, of radius `base_radius`, is centered on `origin`
+    and its top, of radius `top_radius`, is `height` further along `along_axis`.
+    """
+
+    debug_name = "selection cone"
+
+    def __init__(
+        self, origin, along_axis, height, base_radius, top_radius=0, debug=False
+    ):
+        if height <= 0:
+            raise ValueError("height must be positive")
+        if base_radius < 0 or top_radius < 0:
+            raise ValueError("base_radius and top_radius must not be negative")
+        self.axis = self.get_axis(along_axis)
+        xdir = self.get_ortho_vector(self.axis)
+        self.base = cq.Plane(cq.Vector(origin), xdir, self.axis.toTuple())
+        self.height = height
+        self.base_radius = base_radius
+        self.top_radius = top_radius
+        self.debug = debug
+
+    def debug_shape(self, points):
+        return utils.make_debug_cone(
+            utils.plane_key(self.base), self.height, self.base_radius, self.top_radius
+        )
+
+    def mask(self, points):
+        p_radius, p_height = self.radius_and_height(points)
+        radius_at_height = self.base_radius + (self.top_radius - self.base_radius) * (
+            p_height / self.height
+        )
+        return (p_radius < radius_at_height) & (p_height < self.height) & (p_height > 0)
+
+
+class CompositeSelector(RegionSelector):
+    """
+    Base class of the boolean combinations of region selectors.
+
+    The centers of the shapes are computed once and every region
+    of the expression is evaluated on them as a boolean mask.
+    """
+
+    def __init__(self, *regions):
+        for region in regions:
+            if not isinstance(region, RegionSelector):
+                raise TypeError(
+                    "Cannot combine type '{}' in a region expression".format(
+                        type(region)
+                    )
+                )
+        self.regions = regions
+
+    def debug_shape(self, points):
+        shapes = cq.Workplane()
+        for region in self.regions:
+            shapes = shapes.add(region.debug_shape(points))
+        return shapes
+
+    def show_debug(self, points):
+        for region in self.regions:
+            region.show_debug(points)
+
+
+class UnionSelector(CompositeSelector):
+    """
+    Selects any shape present in at least one of the regions.
+    """
+
+    def mask(self, points):
+        inside = np.zeros(len(points), dtype=bool)
+        for region in self.regions:
+            inside |= region.mask(points)
+        return inside
+
+    def __add__(self, other):
+        if isinstance(other, RegionSelector):
+            return UnionSelector(*self.regions, other)
+        return super().__add__(other)
+
+
+class IntersectionSelector(CompositeSelector):
+    """
+    Selects any shape present in all of the regions.
+    """
+
+    def mask(self, points):
+        inside = np.ones(len(points), dtype=bool)
+        for region in self.regions:
+            inside &= region.mask(points)
+        return inside
+
+    def __and__(self, other):
+        if isinstance(other, RegionSelector):
+            return IntersectionSelector(*self.regions, other)
+        return super().__and__(other)
+
+
+class DifferenceSelector(CompositeSelector):
+    """
+    Selects any shape present in the first region but in none of the others.
+    """
+
+    def __init__(self, region, *removed):
+        super().__init__(region, *removed)
+
+    def mask(self, points):
+        inside = self.regions[0].mask(points)
+        for region in self.regions[1:]:
+            inside &= ~region.mask(points)
+        return inside
+
+    def __sub__(self, other):
+        if isinstance(other, RegionSelector):
+            return DifferenceSelector(*self.regions, other)
+        return super().__sub__(other)
+
+
+class ComplementSelector(CompositeSelector):
+    """
+    Selects any shape that is not present in the region.
+    """
+
+    def __init__(self, region):
+        super().__init__(region)
+
+    def mask(self, points):
+        return ~self.regions[0].mask(points)
+
+    def __neg__(self):
+        return self.regions[0]
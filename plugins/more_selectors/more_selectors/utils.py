@@ -1,11 +1,74 @@
 import cadquery as cq
+import numpy as np
+from functools import lru_cache
+from math import ceil, log2
 
+DEBUG_CACHE_SIZE = 128
+DEBUG_OPTIONS = {"alpha": 0.7, "color": (64, 164, 223)}
 
-def make_debug_cylinder(plane, outer_radius, inner_radius=None, height=None):
+
+def get_centers(objectList):
+    """
+    Returns the centers of the given shapes as a (n, 3) array
+    """
+    return np.array([o.Center().toTuple() for o in objectList], dtype=float).reshape(
+        -1, 3
+    )
+
+
+def to_local_coords(points, plane):
+    """
+    Expresses a (n, 3) array of global points in the coordinates of `plane`
+    """
+    rotation = np.array(
+        [plane.xDir.toTuple(), plane.yDir.toTuple(), plane.zDir.toTuple()]
+    )
+    return (points - np.array(plane.origin.toTuple())) @ rotation.T
+
+
+def plane_key(plane):
+    """
+    Returns a hashable description of `plane` to use as a cache key
+    """
+    return (plane.origin.toTuple(), plane.xDir.toTuple(), plane.zDir.toTuple())
+
+
+def bounded_length(points, origin):
+    """
+    Returns a length large enough for a debug shape centered on `origin`
+    to cover the bounding box of `points`.
+    It is rounded up to a power of two so that it stays the same, and
+    the debug shape can be reused, for similar models.
+    """
+    if len(points) == 0:
+        return 1.0
+    corners = np.array(
+        [[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=bool
+    )
+    bbox_corners = np.where(corners, points.max(axis=0), points.min(axis=0))
+    distance = np.linalg.norm(bbox_corners - np.array(origin), axis=1).max()
+    return 2.0 ** ceil(log2(max(distance, 0.5) * 1.1))
+
+
+def get_viewer():
+    """
+    Returns the `show_object` function of the viewer if there is one
+    """
+    try:
+        return show_object
+    except NameError:
+        return None
+
+
+@lru_cache(maxsize=DEBUG_CACHE_SIZE)
+def make_debug_cylinder(
+    plane_key, outer_radius, inner_radius=None, height=None, length=None
+):
+    plane = cq.Plane(*plane_key)
     infinite = False
     if height is None:
         infinite = True
-        height = 10000
+        height = length
     if inner_radius is None:
         cyl = cq.Workplane(plane).circle(outer_radius).extrude(height, both=infinite)
     else:
@@ -15,17 +78,10 @@ def make_debug_cylinder(plane, outer_radius, inner_radius=None, height=None):
             .circle(inner_radius)
             .extrude(height, both=infinite)
         )
-    try:
-        show_object(
-            cyl,
-            name="selection cylinder",
-            options={"alpha": 0.7, "color": (64, 164, 223)},
-        )
-
-    except NameError:
-        pass
+    return cyl
 
 
+@lru_cache(maxsize=DEBUG_CACHE_SIZE)
 def make_debug_sphere(origin, outer_radius, inner_radius=None):
     if inner_radius is None:
         sphere = cq.Workplane().transformed(offset=origin).sphere(outer_radius)
@@ -37,11 +93,26 @@ def make_debug_sphere(origin, outer_radius, inner_radius=None):
             .sphere(outer_radius)
             .cut(inner_sphere)
         )
-    try:
-        show_object(
-            sphere,
-            name="selection sphere",
-            options={"alpha": 0.7, "color": (64, 164, 223)},
-        )
-    except NameError:
-        pass
+    return sphere
+
+
+@lru_cache(maxsize=DEBUG_CACHE_SIZE)
+def make_debug_box(plane_key, length, width, height):
+    return cq.Workplane(cq.Plane(*plane_key)).rect(length, width).extrude(height)
+
+
+@lru_cache(maxsize=DEBUG_CACHE_SIZE)
+def make_debug_slab(plane_key, thickness, length):
+    return (
+        cq.Workplane(cq.Plane(*plane_key))
+        .rect(2 * length, 2 * length)
+        .extrude(thickness)
+    )
+
+
+@lru_cache(maxsize=DEBUG_CACHE_SIZE)
+def make_debug_cone(plane_key, height, base_radius, top_radius):
+    plane = cq.Plane(*plane_key)
+    return cq.Workplane(plane).add(
+        cq.Solid.makeCone(base_radius, top_radius, height, plane.origin, plane.zDir)
+    )
@@ -6,9 +6,9 @@ description = "Add more selectors to cadquery "
 long_description = ""
 author = "Romain FERRU"
 author_email = "Romain.ferru@gmail.com"
-install_requires = (
-    []
-)  # Any dependencies that pip also needs to install to make this plugin work
+install_requires = [
+    "numpy"
+]  # Any dependencies that pip also needs to install to make this plugin work
 
 
 setup(
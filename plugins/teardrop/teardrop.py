@@ -1,23 +1,29 @@
 import math
-from typing import Optional
+from itertools import repeat
+from numbers import Real
+from functools import lru_cache
+from typing import Optional, Sequence, Union
 import cadquery as cq
-from cadquery.occ_impl.geom import Vector
-from cadquery.occ_impl.shapes import Edge, Wire
+from cadquery.occ_impl.geom import Location, Vector, VectorLike
+from cadquery.occ_impl.shapes import Edge, Shape, Solid, Wire
 
+from OCP.BRepAlgoAPI import BRepAlgoAPI_Cut
+from OCP.TopTools import TopTools_ListOfShape
 
-def _teardrop(self, radius: float = 1, rotate: float = 0, clip: Optional[float] = None):
-
-    """
-    Make a teardrop shape (wire) for each item on the stack.
 
-    The use case is in making teardrop shaped holes for 3D printing with Fused filament fabrication 
-    (FFF) to reduce the overhang angle compared to standard holes.  Truncated flat-topped holes can
-    be generated where the small horizontal gap is bridged when printing.
+# number of distinct teardrop wires kept in memory
+TEMPLATE_CACHE_SIZE = 64
+# the dimensions are rounded to this number of digits to look up the cached wires
+TEMPLATE_DIGITS = 9
+# holes whose axis is within this angle (in radians) of the up direction are not rotated
+ALIGN_TOLERANCE = 1e-6
 
-    :param radius: radius of circle
-    :param rotate: rotation angle in degrees
-    :param clip: clipping distance along line from center to vertex to create a truncated teardrop
 
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _teardrop_wire(radius: float, rotate: float, clip: Optional[float]) -> Wire:
+    """
+    Returns the teardrop wire centered on the origin, the template placed
+    at each item on the stack
     """
 
     overhang_angle = 45
@@ -74,10 +80,168 @@ def _teardrop(self, radius: float = 1, rotate: float = 0, clip: Optional[float]
         edges.append(Edge.makeThreePointArc(p1, p2, p3))
         edges.append(Edge.makeLine(p1, p3))
 
-    w = Wire.assembleEdges(edges).rotate(Vector(0, 0, 0), Vector(0, 0, 1), rotate)
+    return Wire.assembleEdges(edges).rotate(Vector(0, 0, 0), Vector(0, 0, 1), rotate)
+
+
+def _teardrop(self, radius: float = 1, rotate: float = 0, clip: Optional[float] = None):
+
+    """
+    Make a teardrop shape (wire) for each item on the stack.
+
+    The use case is in making teardrop shaped holes for 3D printing with Fused filament fabrication 
+    (FFF) to reduce the overhang angle compared to standard holes.  Truncated flat-topped holes can
+    be generated where the small horizontal gap is bridged when printing.
+
+    :param radius: radius of circle
+    :param rotate: rotation angle in degrees
+    :param clip: clipping distance along line from center to vertex to create a truncated teardrop
+
+    """
+
+    w = _teardrop_wire(
+        round(radius, TEMPLATE_DIGITS),
+        round(rotate, TEMPLATE_DIGITS),
+        None if clip is None else round(clip, TEMPLATE_DIGITS),
+    )
+
+    # copies of the template, the booleans using the placed wires would add
+    # to the edges of the cached wire and slow down every later call
+    return self.eachpoint(lambda loc: w.copy().moved(loc), True)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _teardrop_prism(radius: float, clip: Optional[float], depth: float) -> Solid:
+    """
+    Returns the teardrop prism boring from the origin along -Z, with its
+    vertex along +Y, the template placed at each item on the stack
+    """
+    return Solid.extrudeLinear(
+        _teardrop_wire(radius, 0, clip), [], Vector(0, 0, -depth)
+    )
+
+
+def _up_angle(up: Vector, loc: Location) -> float:
+    """
+    Returns the rotation in degrees around the Z axis of loc that points
+    the vertex of the teardrop (+Y) to the up direction, 0 if the Z axis
+    of loc is along the up direction
+    """
+    # only the rotation of loc applies to directions
+    local = Vector(up.wrapped.Transformed(loc.inverse.wrapped.Transformation()))
+    if math.hypot(local.x, local.y) <= ALIGN_TOLERANCE * local.Length:
+        return 0
+    return math.degrees(math.atan2(-local.x, local.y))
+
+
+def _is_direction(value) -> bool:
+    """
+    Tells if value is a single direction: a Vector or three numbers
+    """
+    if isinstance(value, Vector):
+        return True
+    try:
+        return len(value) == 3 and all(isinstance(c, Real) for c in value)
+    except TypeError:
+        return False
+
+
+def _direction(value) -> Vector:
+    return value if isinstance(value, Vector) else Vector(*(float(c) for c in value))
+
+
+def _cut_prisms(
+    solid: Shape, prisms: Sequence[Solid], tol: Optional[float] = None
+) -> Shape:
+    """
+    Removes the placed teardrop prisms from the solid, the faces the holes
+    go through are split once for all of them instead of once per hole
+    """
+    cut_op = BRepAlgoAPI_Cut()
+
+    arg = TopTools_ListOfShape()
+    arg.Append(solid.wrapped)
+    holes = TopTools_ListOfShape()
+    for prism in prisms:
+        holes.Append(prism.wrapped)
+    cut_op.SetArguments(arg)
+    cut_op.SetTools(holes)
+
+    if tol:
+        cut_op.SetFuzzyValue(tol)
+    cut_op.SetRunParallel(True)
+    cut_op.Build()
+
+    if not cut_op.IsDone():
+        raise ValueError("teardropHole - the teardrop prisms could not be cut")
+    return Shape.cast(cut_op.Shape())
+
+
+def _teardropHole(
+    self,
+    radius: float = 1,
+    depth: Optional[float] = None,
+    rotate: float = 0,
+    clip: Optional[float] = None,
+    up: Optional[Union[VectorLike, Sequence[VectorLike]]] = None,
+    clean: bool = True,
+    tol: Optional[float] = None,
+):
+    """
+    Make a teardrop shaped hole at each item on the stack, boring into
+    the workplane (along its -Z axis) like Workplane.hole.
+
+    The teardrop prism is built once and all the holes are cut with a
+    single boolean operation.
+
+    :param radius: radius of circle
+    :param depth: depth of the holes, through all if None
+    :param rotate: rotation angle in degrees
+    :param clip: clipping distance along line from center to vertex to create a truncated teardrop
+    :param up: print direction, in global coordinates, the vertex of each teardrop is pointed to.
+        Either one direction for all the holes or one for each item on the stack. The rotate
+        angle is added to the rotation aligning the vertex to this direction.
+    :param clean: call :py:meth:`clean` afterwards to have a clean shape
+    :param tol: fuzzy tolerance of the boolean operation
+    """
 
-    return self.eachpoint(lambda loc: w.moved(loc), True)
+    if depth is None:
+        depth = self.largestDimension()
+
+    prism = _teardrop_prism(
+        round(radius, TEMPLATE_DIGITS),
+        None if clip is None else round(clip, TEMPLATE_DIGITS),
+        round(depth, TEMPLATE_DIGITS),
+    )
+
+    if up is None:
+        ups = None
+    elif _is_direction(up):
+        ups = repeat(_direction(up))
+    else:
+        # eachpoint uses the workplane origin when the stack is empty
+        items = len(self.objects) or 1
+        if len(up) != items:
+            raise ValueError(
+                f"teardropHole - 'up' has {len(up)} directions for {items} items on the stack"
+            )
+        ups = iter([_direction(u) for u in up])
+
+    def _one_hole(loc):
+        angle = rotate
+        if ups is not None:
+            angle += _up_angle(next(ups), self.plane.location * loc)
+        # distinct copies of the prism, the cut is slower with prisms sharing
+        # their topology and would add to the edges of the cached one
+        return prism.copy().moved(loc * Location(Vector(), Vector(0, 0, 1), angle))
+
+    solid = self.findSolid()
+    prisms = self.eachpoint(_one_hole, True, clean=False).vals()
+    result = _cut_prisms(solid, prisms, tol)
+    if clean:
+        result = result.clean()
+    return self.newObject([result])
 
 
 # Patch the function into the Workplane class
 cq.Workplane.teardrop = _teardrop
+cq.Workplane.teardropHole = _teardropHole
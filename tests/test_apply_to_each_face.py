@@ -1,5 +1,7 @@
 import sys
 
+import pytest
+
 from typing import List
 
 import cadquery as cq
@@ -9,6 +11,7 @@ from plugins.apply_to_each_face import (
     WORLD_AXIS_PLANES_XY_ZX_YZ,
     XAxisClosestTo,
     WORLD_AXIS_UNIT_VECTORS_YXZ,
+    Checkpoint,
 )
 
 
@@ -140,3 +143,214 @@ def test_two_disconnected_cubes_x_axis_closest_to():
     # 1 cylinder is created for each face of two cubes
     # each cube has 6 faces
     assert len(result.faces().vals()) == 3 * 6 * 2, "Wrong number of faces"
+
+
+def _draw_slot(wp, face):
+    # module level, the callbacks are pickled where processes are not forked
+    return wp.rect(2, 1).extrude(0.5, both=True)
+
+
+@pytest.mark.parametrize("combine", [True, "cut", False])
+def test_parallel_same_as_serial(combine):
+    body = cq.Workplane("XY").polygon(6, 10.0).extrude(3, taper=45)
+
+    def apply(parallel):
+        return (
+            body.faces("not(<Z or >Z)")
+            .applyToEachFace(
+                XAxisInPlane(WORLD_AXIS_PLANES_XY_ZX_YZ),
+                _draw_slot,
+                combine=combine,
+                parallel=parallel,
+                processes=2,
+            )
+            .vals()
+        )
+
+    serial = apply(False)
+    parallel = apply(True)
+
+    assert len(parallel) == len(serial) > 0
+    for s, p in zip(serial, parallel):
+        assert len(p.Faces()) == len(s.Faces())
+        assert abs(p.Volume() - s.Volume()) < TOLERANCE
+
+
+def test_reuse_congruent_faces():
+    calls = []
+
+    def draw(wp, face):
+        calls.append(face)
+        return wp.rect(2, 1).extrude(1).edges("|Z").fillet(0.2)
+
+    panel = (
+        cq.Workplane("XY")
+        .rarray(12, 12, 3, 2)
+        .box(10, 10, 10)
+        .union(cq.Workplane("XY").move(0, 20).box(8, 10, 10))
+    )
+
+    def apply(reuse_congruent):
+        calls.clear()
+        return panel.faces().applyToEachFace(
+            XAxisInPlane(WORLD_AXIS_PLANES_XY_ZX_YZ),
+            draw,
+            combine=False,
+            reuse_congruent=reuse_congruent,
+        )
+
+    expected = apply(False).vals()
+    assert len(calls) == 7 * 6
+
+    result = apply(True).vals()
+    # all 10x10 faces are the same, and so are the 8x10 faces
+    # that all have their 8 long side along their x axis
+    assert len(calls) == 2
+
+    assert len(result) == len(expected)
+    for r, e in zip(result, expected):
+        assert (r.Center() - e.Center()).Length < TOLERANCE
+        assert abs(r.Volume() - e.Volume()) < TOLERANCE
+        assert r.BoundingBox().add(e.BoundingBox()).DiagonalLength == pytest.approx(
+            e.BoundingBox().DiagonalLength
+        )
+
+
+@pytest.mark.parametrize(
+    "workplane_selector",
+    [
+        XAxisInPlane(WORLD_AXIS_PLANES_XY_ZX_YZ),
+        XAxisClosestTo(WORLD_AXIS_UNIT_VECTORS_YXZ),
+    ],
+)
+def test_batched_planes(workplane_selector):
+    faces = (
+        cq.Workplane("XY")
+        .polygon(7, 10.0)
+        .extrude(3, taper=30)
+        .faces(">Z")
+        .edges()
+        .fillet(0.5)
+        .faces()
+        .vals()
+    )
+
+    planes = workplane_selector.planes(faces)
+
+    assert len(planes) == len(faces)
+    for face, plane in zip(faces, planes):
+        assert (plane.origin - face.Center()).Length < TOLERANCE
+        assert (plane.zDir - face.normalAt()).Length < TOLERANCE
+        assert (plane.xDir - workplane_selector(face).plane.xDir).Length < TOLERANCE
+
+
+def test_batched_planes_error():
+    faces = cq.Workplane("XY").box(1, 1, 1).faces().vals()
+
+    with pytest.raises(ValueError):
+        XAxisInPlane([cq.Vector(0, 0, 1)]).planes(faces)
+
+
+def _grid_faces():
+    return cq.Workplane("XY").rarray(12, 12, 3, 2).box(10, 10, 10).faces(">Z or <Z")
+
+
+def _draw_boss(wp, face):
+    return wp.rect(2, 1).extrude(1)
+
+
+def test_iter_apply_to_each_face_progress():
+    faces = _grid_faces()
+    progress = []
+
+    stream = faces.iterApplyToEachFace(
+        XAxisInPlane(WORLD_AXIS_PLANES_XY_ZX_YZ),
+        _draw_boss,
+        progress=lambda done, total: progress.append((done, total)),
+    )
+
+    results = []
+    for face, wp, shape in stream:
+        assert (wp.plane.origin - face.Center()).Length < TOLERANCE
+        results.append(shape)
+        if len(results) == 4:
+            break
+
+    assert progress == [(1, 12), (2, 12), (3, 12), (4, 12)]
+
+
+@pytest.mark.parametrize("batched", [False, True])
+def test_iter_apply_to_each_face_lazy_workplanes(monkeypatch, batched):
+    """
+    Test that the workplanes are computed as the faces are drawn,
+    not all of them before the first one
+    """
+    monkeypatch.setattr(apply_to_each_face, "STREAM_CHUNK_SIZE", 5)
+    selector = XAxisInPlane(WORLD_AXIS_PLANES_XY_ZX_YZ)
+    computed = []
+
+    class Spy:
+        def __call__(self, face):
+            computed.append(1)
+            return selector(face)
+
+    class BatchedSpy(Spy):
+        def planes(self, faces):
+            computed.append(len(faces))
+            return selector.planes(faces)
+
+    stream = _grid_faces().iterApplyToEachFace(
+        BatchedSpy() if batched else Spy(), _draw_boss
+    )
+    next(stream)
+    assert computed == ([5] if batched else [1])
+
+    assert len(list(stream)) == 11
+    assert computed == ([5, 5, 2] if batched else [1] * 12)
+
+
+def test_checkpoint_resume(tmp_path):
+    path = str(tmp_path / "checkpoint.bin")
+    faces = _grid_faces()
+    drawn = []
+
+    def failing_draw(wp, face):
+        if len(drawn) == 7:
+            raise RuntimeError("failed drawing")
+        drawn.append(face)
+        return _draw_boss(wp, face)
+
+    with pytest.raises(RuntimeError):
+        faces.applyToEachFace(
+            XAxisInPlane(WORLD_AXIS_PLANES_XY_ZX_YZ),
+            failing_draw,
+            checkpoint=Checkpoint(path, save_every=5),
+        )
+
+    checkpoint = Checkpoint(path)
+    assert len(checkpoint) == 7
+
+    drawn.clear()
+    result = faces.applyToEachFace(
+        XAxisInPlane(WORLD_AXIS_PLANES_XY_ZX_YZ),
+        lambda wp, face: drawn.append(face) or _draw_boss(wp, face),
+        checkpoint=checkpoint,
+    )
+    expected = faces.applyToEachFace(
+        XAxisInPlane(WORLD_AXIS_PLANES_XY_ZX_YZ), _draw_boss
+    )
+
+    assert len(drawn) == 12 - 7
+    assert len(Checkpoint(path)) == 12
+    assert abs(result.val().Volume() - expected.val().Volume()) < TOLERANCE
+    assert len(result.faces().vals()) == len(expected.faces().vals())
+
+
+def test_checkpoint_with_parallel():
+    with pytest.raises(ValueError):
+        _grid_faces().applyToEachFace(
+            XAxisInPlane(WORLD_AXIS_PLANES_XY_ZX_YZ),
+            _draw_boss,
+            parallel=True,
+            checkpoint=Checkpoint(),
+        )
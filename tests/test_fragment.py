@@ -1,3 +1,4 @@
+import pytest
 import cadquery as cq
 import plugins.fragment.fragment as fragment
 
@@ -60,3 +61,377 @@ def test_fragment_compound():
     plate_compound = plate.fragment(plate3)
 
     assert len(plate_compound.vals()[0].Solids()) == 4
+
+
+def test_fragment_options():
+    """
+    Tests that the use_obb, parallel and nondestructive options give the same fragments
+    """
+    plate = cq.Workplane("XY").box(20, 20, 20)
+    plate2 = cq.Workplane("XY").box(10, 10, 10).translate((10, 10, 10))
+    volume = plate.val().Volume()
+
+    for options in [
+        dict(use_obb=True),
+        dict(parallel=False),
+        dict(nondestructive=True),
+    ]:
+        result = plate.fragment(plate2, **options)
+        volumes = sorted(s.Volume() for s in result.vals()[0].Solids())
+        assert volumes == pytest.approx([125.0, 875.0, 7875.0])
+    # the input is not modified
+    assert plate.val().Volume() == pytest.approx(volume)
+
+
+def test_fragment_many_solids():
+    """
+    Tests that all the fragments are collected when fragmenting many solids
+    """
+    cells = [
+        cq.Solid.makeBox(1.5, 1, 1).moved(cq.Location(cq.Vector(i, 0, 0)))
+        for i in range(50)
+    ]
+    result = cells[0]._fragment(*cells[1:])
+
+    assert len(result.Solids()) == 99
+    assert sum(s.Volume() for s in result.Solids()) == pytest.approx(50.5)
+
+
+def _lattice():
+    """
+    Returns 3 separate clusters of 2 overlapping boxes and a lone box
+    """
+    cell = cq.Solid.makeBox(1.5, 1, 1)
+    cells = [
+        cell.moved(cq.Location(cq.Vector(i, 3 * j, 0)))
+        for j in range(3)
+        for i in range(2)
+    ]
+    return cells + [cell.moved(cq.Location(cq.Vector(10, 10, 10)))]
+
+
+def test_overlap_components():
+    cells = _lattice()
+    components = fragment._overlap_components(cells, fragment.CLUSTER_GAP)
+
+    assert components == [[0, 1], [2, 3], [4, 5], [6]]
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_fragment_cluster(processes):
+    """
+    Tests that fragmenting the clusters separately gives the same fragments
+    """
+    cells = _lattice()
+    expected = cells[0]._fragment(*cells[1:])
+    result = cells[0]._fragment(*cells[1:], cluster=True, processes=processes)
+
+    assert len(result.Solids()) == len(expected.Solids()) == 3 * 3 + 1
+    assert sorted(s.Volume() for s in result.Solids()) == pytest.approx(
+        sorted(s.Volume() for s in expected.Solids())
+    )
+    # the lone box is passed through
+    assert any(s.isSame(cells[-1]) for s in result.Solids())
+
+
+def test_fragment_cluster_workplane():
+    plate = cq.Workplane("XY").box(20, 20, 20)
+    plate2 = cq.Workplane("XY").box(10, 10, 10).translate((10, 10, 10))
+    plate3 = cq.Workplane("XY").box(2, 2, 2).translate((50, 0, 0))
+    others = cq.Compound.makeCompound([plate2.val(), plate3.val()])
+    result = plate.fragment(others, cluster=True)
+
+    assert len(result.vals()[0].Solids()) == 4
+
+
+def test_fragment_incremental():
+    """
+    Tests that adding solids one at a time to a fragmented compound gives
+    the same fragments as fragmenting everything at once, and keeps the
+    fragments far from the added solids
+    """
+    domain = [
+        cq.Solid.makeBox(10, 10, 10).moved(cq.Location(cq.Vector(10 * i, 0, 0)))
+        for i in range(4)
+    ]
+    inclusions = [
+        cq.Solid.makeSphere(2).moved(cq.Location(cq.Vector(x, 5, 5)))
+        for x in (5, 10, 35)
+    ]
+
+    result = domain[0]._fragment(*domain[1:])
+    for inclusion in inclusions:
+        previous = result.Solids()
+        result = result._fragment(inclusion, incremental=True)
+
+    expected = domain[0]._fragment(*domain[1:], *inclusions)
+    assert len(result.Solids()) == len(expected.Solids())
+    assert sorted(s.Volume() for s in result.Solids()) == pytest.approx(
+        sorted(s.Volume() for s in expected.Solids())
+    )
+    # the last inclusion only touches the last box, the 6 other fragments are kept
+    assert len(previous) == 7
+    assert sum(any(s.isSame(p) for p in previous) for s in result.Solids()) == 6
+
+
+def test_fragment_incremental_workplane():
+    domain = (
+        cq.Workplane("XY")
+        .box(20, 20, 20)
+        .fragment(
+            cq.Workplane("XY").box(10, 10, 10).translate((10, 10, 10)), clean=False
+        )
+    )
+    result = domain.fragment(
+        cq.Workplane("XY").box(2, 2, 2).translate((-5, -5, -5)),
+        incremental=True,
+        clean=False,
+    )
+
+    assert len(result.vals()[0].Solids()) == 4
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_fragment_clean_scoped(processes):
+    """
+    Tests that the scoped clean gives the same result as the full clean
+    and keeps the fragments the builder did not modify
+    """
+    cells = _lattice()
+    fragments = cells[0]._fragment(*cells[1:], cluster=True)
+    expected = fragments.clean()
+    result = fragment._clean_fragments(fragments, cells, processes)
+
+    assert len(result.Solids()) == len(expected.Solids())
+    assert len(result.Faces()) == len(expected.Faces())
+    assert len(result.Edges()) == len(expected.Edges())
+    assert [s.Volume() for s in result] == pytest.approx([s.Volume() for s in expected])
+    assert list(result)[-1].isSame(cells[-1])
+
+
+def test_fragment_clean_scoped_incremental(monkeypatch):
+    """
+    Tests that the scoped clean only cleans the fragments modified by an
+    incremental fragment
+    """
+    domain = (
+        cq.Workplane("XY")
+        .box(40, 10, 10)
+        .fragment(cq.Workplane("XY").box(10, 10, 10).translate((15, 0, 0)), clean=False)
+    )
+
+    cleaned = []
+    unify = fragment._unify
+
+    def spy(shape, neighbours):
+        cleaned.append(len(shape.Solids()))
+        return unify(shape, neighbours)
+
+    inclusion = cq.Workplane("XY").box(2, 2, 2).translate((-15, 0, 0))
+    monkeypatch.setattr(fragment, "_unify", spy)
+    result = domain.fragment(inclusion, incremental=True, clean="scoped",).val()
+
+    # the box at x=15 is kept and the inclusion is not modified by the
+    # builder, only the box around the inclusion is cleaned
+    assert cleaned == [1]
+    assert len(result.Solids()) == 3
+    assert result.Volume() == pytest.approx(4000)
+
+
+def _shared_faces(compound):
+    faces = [f for s in compound.Solids() for f in set(s.Faces())]
+    return len(faces) - len(set(faces))
+
+
+@pytest.mark.parametrize("clean", ["scope", "full", None])
+def test_fragment_clean_invalid(clean):
+    box = cq.Workplane().box(1, 1, 1)
+    with pytest.raises(ValueError, match="'scoped'"):
+        box.fragment(cq.Workplane().box(1, 1, 1).translate((1, 0, 0)), clean=clean)
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_fragment_clean_scoped_conformal(processes):
+    """
+    Tests that the scoped clean of an incremental fragment of a cleaned
+    domain keeps the faces shared with the kept fragments
+    """
+    # two copies of a box next to two half boxes, the +X face of the box is
+    # split in two, shared with each half box
+    boxes = []
+    for x in (0, 50):
+        boxes += [
+            cq.Solid.makeBox(10, 10, 10, cq.Vector(x, 0, 0)),
+            cq.Solid.makeBox(10, 5, 10, cq.Vector(x + 10, 0, 0)),
+            cq.Solid.makeBox(10, 5, 10, cq.Vector(x + 10, 5, 0)),
+        ]
+    domain = boxes[0]._fragment(*boxes[1:]).clean()
+    assert _shared_faces(domain) == 6
+
+    # a sphere in each box, cleaned in two groups
+    spheres = [cq.Solid.makeSphere(2, cq.Vector(x + 5, 5, 5)) for x in (0, 50)]
+    fragments = domain._fragment(*spheres, incremental=True)
+    expected = fragments.clean()
+    result = fragment._clean_fragments(fragments, [*domain, *spheres], processes)
+
+    assert _shared_faces(result) == _shared_faces(expected) == 10
+    assert len(result.Faces()) == len(expected.Faces())
+
+
+def test_fragment_provenance():
+    """
+    Tests that the provenance maps the fragments to the inputs containing them
+    """
+    plate = cq.Workplane("XY").box(20, 20, 20)
+    plate2 = cq.Workplane("XY").box(10, 10, 10).translate((10, 10, 10))
+    result = plate.fragment(plate2, provenance=True)
+    fragments = list(result.val())
+    provenance = result.provenance
+
+    assert len(provenance.sources) == len(fragments) == 3
+    assert len(provenance.fragments) == 2
+    for k, fragment in enumerate(fragments):
+        center = fragment.Center()
+        for i, solid in enumerate([plate.val(), plate2.val()]):
+            assert (i in provenance.sources[k]) == solid.isInside(center)
+    assert sorted(len(f) for f in provenance.fragments) == [2, 2]
+
+
+@pytest.mark.parametrize(
+    "options", [{}, {"cluster": True}, {"cluster": True, "processes": 2}]
+)
+def test_fragment_provenance_cluster(options):
+    cells = _lattice()
+    result, provenance = cells[0]._fragment(*cells[1:], provenance=True, **options)
+
+    for k, fragment in enumerate(result):
+        center = fragment.Center()
+        sources = [i for i, cell in enumerate(cells) if cell.isInside(center)]
+        assert provenance.sources[k] == sources
+    # the lone box is its own fragment
+    assert len(provenance.fragments[-1]) == 1
+
+
+def test_fragment_provenance_incremental():
+    domain = [
+        cq.Solid.makeBox(10, 10, 10).moved(cq.Location(cq.Vector(10 * i, 0, 0)))
+        for i in range(3)
+    ]
+    inclusion = cq.Solid.makeSphere(2).moved(cq.Location(cq.Vector(10, 5, 5)))
+    fragmented = domain[0]._fragment(*domain[1:])
+    result, provenance = fragmented._fragment(
+        inclusion, incremental=True, provenance=True
+    )
+
+    inputs = list(fragmented) + [inclusion]
+    assert len(provenance.fragments) == 4
+    for k, fragment in enumerate(result):
+        center = fragment.Center()
+        sources = [i for i, s in enumerate(inputs) if s.isInside(center)]
+        assert provenance.sources[k] == sources
+
+
+def _boxes(step):
+    return [
+        cq.Solid.makeBox(1, 1, 1).moved(cq.Location(cq.Vector(step * i, 0, 0)))
+        for i in range(4)
+    ]
+
+
+@pytest.mark.parametrize(
+    "step, kind", [(1.5, "disjoint"), (1, "touching"), (0.5, "overlapping")]
+)
+def test_classify(step, kind):
+    assert fragment._classify(_boxes(step), 0) == kind
+
+
+def test_classify_spheres():
+    """
+    Tests that solids with overlapping bounding boxes but no contact are disjoint
+    """
+    spheres = [
+        cq.Solid.makeSphere(1).moved(cq.Location(cq.Vector(1.9 * i, 1.9 * i, 0)))
+        for i in range(2)
+    ]
+    assert fragment._classify(spheres, 0) == "disjoint"
+
+
+@pytest.mark.parametrize("glue", ["fast", "Full", None])
+def test_fragment_glue_invalid(glue):
+    box = cq.Workplane().box(1, 1, 1)
+    with pytest.raises(ValueError, match="'auto'"):
+        box.fragment(cq.Workplane().box(1, 1, 1).translate((1, 0, 0)), glue=glue)
+    with pytest.raises(ValueError):
+        box.val()._fragment(box.val(), glue=glue)
+
+
+@pytest.mark.parametrize("step, mode", [(1.5, "full"), (1, "shift"), (0.5, "off")])
+def test_fragment_glue_auto(step, mode, caplog):
+    cells = _boxes(step)
+    expected = cells[0]._fragment(*cells[1:])
+    with caplog.at_level("INFO", logger=fragment.__name__):
+        result = cells[0]._fragment(*cells[1:], glue="auto")
+
+    assert "glue mode {}".format(mode) in caplog.text
+    assert len(result.Solids()) == len(expected.Solids())
+    assert sorted(s.Volume() for s in result.Solids()) == pytest.approx(
+        sorted(s.Volume() for s in expected.Solids())
+    )
+
+
+@pytest.mark.parametrize(
+    "options", [{}, {"cluster": True}, {"cluster": True, "processes": 2}]
+)
+def test_fragment_report(options):
+    """
+    Tests the timings and counts of the fragment report
+    """
+    cells = [
+        cq.Solid.makeBox(1.1, 1, 1).moved(cq.Location(cq.Vector(i, 2 * j, 0)))
+        for j in range(3)
+        for i in range(3)
+    ]
+    result = (
+        cq.Workplane()
+        .add(cells[0])
+        .fragment(cq.Workplane().add(cells[1:]), glue="auto", report=True, **options)
+    )
+    report = result.report
+
+    assert report.inputs == 9
+    assert report.outputs == len(result.val().Solids()) == 15
+    assert report.builders == (3 if options else 1)
+    assert report.glue == ["off"] * report.builders
+    assert report.fuzzy_value == 0
+    assert report.warnings == {}
+    for phase in ("arguments", "intersection", "building", "results", "clean"):
+        assert report.timings[phase] > 0
+    assert (report.timings["cluster"] > 0) == bool(options)
+    assert report.wall_time > 0
+    assert "9 inputs, 15 fragments" in str(report)
+
+
+def test_fragment_report_warnings():
+    """
+    Tests that the warnings of the boolean builder are reported
+    """
+    a = cq.Solid.makeBox(1, 1, 1)
+    b = a.moved(cq.Location(cq.Vector(0.5, 0, 0)))
+    _, report = a._fragment(b, tol=0.6, report=True)
+
+    assert report.fuzzy_value == 0.6
+    assert report.warnings["BOPAlgo_AlertTooSmallEdge"] > 0
+
+
+def test_fragment_error():
+    """
+    Tests that a failure of the boolean builder raises a FragmentError
+    """
+    null = cq.Solid.makeBox(1, 1, 1)
+    null.wrapped = cq.occ_impl.shapes.TopoDS_Shape()
+    with pytest.raises(fragment.FragmentError) as e:
+        cq.Solid.makeBox(1, 1, 1)._fragment(null)
+
+    assert e.value.errors == {"BOPAlgo_AlertNullInputShapes": 1}
+    assert e.value.report.builders == 1
+    assert "BOPAlgo_AlertNullInputShapes" in str(e.value)
@@ -2,6 +2,7 @@ import pytest
 import math
 import importlib
 import itertools
+import json
 import cadquery as cq
 import plugins.heatserts.heatserts as heatsert_module
 import numbers
@@ -116,3 +117,221 @@ def test_heatsert_add_size(box):
 
     # clean up
     importlib.reload(heatsert_module)
+
+
+def test_heatsert_tool_cached():
+    """
+    Tests that the tool solid is built once for all the points and reused
+    by later calls with the same dimensions
+    """
+    heatsert_module._heatsert_tool.cache_clear()
+    plate = cq.Workplane().box(50, 50, 10).faces(">Z").workplane().rarray(10, 10, 3, 3)
+
+    first = plate.heatsert("M3", chamfer=0.5)
+    second = plate.heatsert("M3", chamfer=(0.5, 0.5))
+    info = heatsert_module._heatsert_tool.cache_info()
+    assert (info.misses, info.hits) == (1, 1)
+    assert first.val().Volume() == pytest.approx(second.val().Volume())
+    assert first.faces(">Z").edges("%CIRCLE").size() == 9
+
+    plate.heatsert("M3")
+    assert heatsert_module._heatsert_tool.cache_info().misses == 2
+
+
+@pytest.mark.parametrize("batched", [False, True])
+def test_heatsert_tool_unchanged(batched):
+    """
+    Tests that cutting the holes does not modify the cached tool, which
+    would make every later cut slower
+    """
+    plate = cq.Workplane().box(50, 50, 10).faces(">Z").workplane().rarray(10, 10, 3, 3)
+    tool = heatsert_module._heatsert_tool(*heatsert_module._tool_key("M3", None, None))
+
+    def curves():
+        return [e.wrapped.TShape().Curves().Size() for e in tool.Edges()]
+
+    before = curves()
+    plate.heatsert("M3", batched=batched)
+    assert curves() == before
+
+
+@pytest.mark.parametrize("options", [{}, {"tol": 1e-4}, {"clean": False}])
+@pytest.mark.parametrize("thickness", [10, 6])
+def test_heatsert_batched(options, thickness):
+    """
+    Tests that the batched mode makes the same holes as cutEach, blind
+    holes and holes going through the plate
+    """
+    plate = (
+        cq.Workplane()
+        .box(60, 60, thickness)
+        .faces(">Z")
+        .workplane()
+        .rarray(10, 10, 5, 5)
+    )
+
+    expected = plate.heatsert("M3", bolt_clear=8, chamfer=0.5)
+    batched = plate.heatsert("M3", bolt_clear=8, chamfer=0.5, batched=True, **options)
+
+    assert batched.val().isValid()
+    assert batched.val().Volume() == pytest.approx(expected.val().Volume())
+    assert batched.faces(">Z").edges("%CIRCLE").size() == 25
+    if options.get("clean", True):
+        assert batched.faces().size() == expected.faces().size()
+
+
+@pytest.fixture
+def catalogs(monkeypatch):
+    """
+    Isolates the sizes, defaults and tools loaded by a test
+    """
+    monkeypatch.setattr(
+        heatsert_module, "heatsert_dims", dict(heatsert_module.heatsert_dims)
+    )
+    monkeypatch.setattr(heatsert_module, "heatsert_defaults", {})
+    monkeypatch.setattr(heatsert_module, "_tool_library", {})
+    heatsert_module._heatsert_tool.cache_clear()
+
+
+CSV_CATALOG = """vendor,size,units,diam,depth,bolt_diam,bolt_clear,chamfer,chamfer_depth
+acme,M3,mm,4.2,5.7,3,,0.5,
+acme,M2,mm,3.2,4,2,8,,
+imperial,#4-40,in,0.2,0.25,0.112,,0.02,0.04
+"""
+
+JSON_CATALOG = """{
+    "vendor": "ruthex",
+    "chamfer": 0.6,
+    "inserts": [
+        {"size": "M3", "diam": 4.0, "depth": 5.7, "bolt_diam": 3},
+        {"size": "M4", "diam": 5.6, "depth": 8.1, "bolt_diam": 4, "chamfer": [1, 2]}
+    ]
+}
+"""
+
+TOML_CATALOG = """units = "in"
+
+[[inserts]]
+vendor = "imperial"
+size = "1/4-20"
+diam = 0.35
+depth = 0.5
+bolt_diam = 0.25
+bolt_clear = 1
+"""
+
+
+@pytest.mark.parametrize(
+    "ext, content, expected",
+    [
+        (
+            "csv",
+            CSV_CATALOG,
+            {
+                "acme/M3": ((4.2, 5.7, 3), {"chamfer": (0.5, 0.5)}),
+                "acme/M2": ((3.2, 4, 2), {"bolt_clear": 8}),
+                "imperial/#4-40": ((5.08, 6.35, 2.8448), {"chamfer": (0.508, 1.016)},),
+            },
+        ),
+        (
+            "json",
+            JSON_CATALOG,
+            {
+                "ruthex/M3": ((4, 5.7, 3), {"chamfer": (0.6, 0.6)}),
+                "ruthex/M4": ((5.6, 8.1, 4), {"chamfer": (1, 2)}),
+            },
+        ),
+        (
+            "toml",
+            TOML_CATALOG,
+            {"imperial/1/4-20": ((8.89, 12.7, 6.35), {"bolt_clear": 25.4})},
+        ),
+    ],
+)
+def test_load_catalog(catalogs, tmp_path, ext, content, expected):
+    path = tmp_path / ("catalog." + ext)
+    path.write_text(content)
+
+    added = heatsert_module.load_catalog(str(path))
+
+    assert list(added) == list(expected)
+    for name, (values, defaults) in expected.items():
+        assert heatsert_module.heatsert_dims[name] == pytest.approx(values)
+        loaded = heatsert_module.heatsert_defaults[name]
+        assert loaded.keys() == defaults.keys()
+        for key, value in defaults.items():
+            assert loaded[key] == pytest.approx(value)
+    assert "M6" in heatsert_module.heatsert_dims
+
+
+def test_catalog_defaults(catalogs, tmp_path):
+    """
+    Tests that the catalog defaults are used unless the options are given
+    """
+    path = tmp_path / "catalog.csv"
+    path.write_text(CSV_CATALOG)
+    heatsert_module.load_catalog(str(path))
+    box = cq.Workplane().box(20, 20, 20).faces(">Z").workplane()
+
+    radii = {round(c.radius(), 3) for c in box.heatsert("acme/M3").edges("%CIRCLE")}
+    assert radii == {2.1, 2.6}
+    radii = {
+        round(c.radius(), 3)
+        for c in box.heatsert("acme/M3", chamfer=0).edges("%CIRCLE")
+    }
+    assert radii == {2.1}
+
+    default_clear = box.heatsert("acme/M2").val().Volume()
+    no_clear = box.heatsert("acme/M2", bolt_clear=0).val().Volume()
+    assert no_clear - default_clear == pytest.approx(
+        math.pi * (2 * 1.2 / 2) ** 2 * 4, rel=1e-3
+    )
+
+
+def test_catalog_errors(catalogs, tmp_path):
+    path = tmp_path / "catalog.csv"
+    path.write_text("size,diam,depth\nM3,4,5\n")
+    with pytest.raises(ValueError):
+        heatsert_module.load_catalog(str(path))
+
+    path.write_text("size,diam,depth,bolt_diam,units\nM3,4,5,3,cm\n")
+    with pytest.raises(ValueError):
+        heatsert_module.load_catalog(str(path))
+
+    path.write_text("size,diam,depth,bolt_diam\nM3,4,5,3,8,0.5\n")
+    with pytest.raises(ValueError):
+        heatsert_module.load_catalog(str(path))
+
+    with pytest.raises(ValueError):
+        heatsert_module.load_catalog(str(tmp_path / "catalog.xml"))
+
+
+def test_tool_library(catalogs, tmp_path):
+    """
+    Tests that the tools read from a library are used instead of building them
+    """
+    path = tmp_path / "catalog.json"
+    path.write_text(JSON_CATALOG)
+    heatsert_module.load_catalog(str(path))
+    library = str(tmp_path / "tools.brep")
+    box = cq.Workplane().box(20, 20, 20).faces(">Z").workplane()
+    expected = box.heatsert("ruthex/M4").val().Volume()
+
+    assert heatsert_module.save_tool_library(library) == 6
+
+    heatsert_module._heatsert_tool.cache_clear()
+    assert heatsert_module.load_tool_library(library) == 6
+    assert box.heatsert("ruthex/M4").val().Volume() == pytest.approx(expected)
+    assert box.heatsert("M3", batched=True).faces().size() == 8
+    assert heatsert_module._heatsert_tool.cache_info().misses == 0
+
+    with pytest.raises(ValueError):
+        heatsert_module.load_tool_library(str(path))
+
+    # a library listing more tools than it holds
+    with open(library, "rb") as f:
+        header, keys, data = f.readline(), json.loads(f.readline()), f.read()
+    with open(library, "wb") as f:
+        f.write(header + json.dumps(keys + keys[:1]).encode() + b"\n" + data)
+    with pytest.raises(ValueError, match="lists 7 tools but holds 6"):
+        heatsert_module.load_tool_library(library)
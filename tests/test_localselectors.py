@@ -0,0 +1,261 @@
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+import cadquery as cq
+import plugins.localselectors.localselectors as localselectors
+
+
+@pytest.fixture
+def box():
+    return cq.Workplane("YZ").box(10, 10, 10)
+
+
+@pytest.mark.parametrize(
+    "local_selector, global_selector",
+    [
+        (">z", ">X"),
+        ("<x", "<Y"),
+        ("|y", "|Z"),
+        ("<x[-2]", "<Y[-2]"),
+        (">>y[1]", ">>Z[1]"),
+        ("not >z and (|x or |y)", "not >X and (|Y or |Z)"),
+        (">Z", ">Z"),
+    ],
+)
+def test_local_axes(box, local_selector, global_selector):
+    """
+    Tests that lowercase axes are the axes of the workplane
+    """
+    assert box.faces(local_selector).vals() == box.faces(global_selector).vals()
+
+
+def test_parsed_selectors_are_cached(box):
+    """
+    Tests that repeated string selections only parse the expression once
+    and reuse the selector object for the same plane
+    """
+    localselectors._parse.cache_clear()
+    localselectors._cached_selector.cache_clear()
+
+    for _ in range(10):
+        box.faces(">z")
+        box.edges(">z")
+    assert localselectors._parse.cache_info().misses == 1
+    assert localselectors._cached_selector.cache_info().misses == 1
+
+    rotated = cq.Workplane("XZ").box(10, 10, 10)
+    rotated.faces(">z")
+    assert localselectors._parse.cache_info().misses == 1
+    assert localselectors._cached_selector.cache_info().misses == 2
+    assert localselectors.string_selector(
+        ">z", box.plane
+    ) is not localselectors.string_selector(">z", rotated.plane)
+
+    # expressions without local axes do not depend on the plane
+    box.faces(">Z")
+    rotated.faces(">Z")
+    assert localselectors._cached_selector.cache_info().misses == 3
+
+
+PLANES_AND_GLOBAL_SELECTORS = [("XY", ">Z"), ("YZ", ">X"), ("XZ", "<Y")]
+
+
+def _select_top(plane_name):
+    wp = cq.Workplane(plane_name).box(10, 10, 10)
+    with localselectors.LocalCoordinates(wp.plane):
+        selector = cq.selectors.StringSyntaxSelector(">z")
+    return selector.filter(wp.faces().vals()) + wp.faces(">z").vals()
+
+
+def test_local_coordinates_threads():
+    """
+    Tests that concurrent threads using different planes do not see each other's axes
+    """
+    plane_names = [name for name, _ in PLANES_AND_GLOBAL_SELECTORS] * 20
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(_select_top, plane_names))
+
+    expected = {
+        name: cq.Workplane(name).box(10, 10, 10).faces(sel).val().Center()
+        for name, sel in PLANES_AND_GLOBAL_SELECTORS
+    }
+    for name, faces in zip(plane_names, results):
+        assert len(faces) == 2
+        for face in faces:
+            assert (face.Center() - expected[name]).Length < 1e-6
+
+
+@pytest.mark.parametrize("selector", [">z", ">Z"])
+def test_string_selector_parsed_under_lock(monkeypatch, selector):
+    """
+    Tests that StringSyntaxSelector parses its string holding the parse lock
+    """
+    locked = []
+
+    def try_lock():
+        if localselectors._parse_lock.acquire(blocking=False):
+            localselectors._parse_lock.release()
+            return True
+        return False
+
+    def init(self, selectorString):
+        # the lock is held by the current thread if another one cannot take it
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            locked.append(not executor.submit(try_lock).result())
+
+    monkeypatch.setattr(localselectors, "old_StringSyntaxSelector_init", init)
+    cq.selectors.StringSyntaxSelector(selector)
+    assert locked == [True]
+
+
+def test_local_coordinates_asyncio_tasks():
+    """
+    Tests that interleaved asyncio tasks using different planes do not see each other's axes
+    """
+
+    async def select(plane_name, global_selector):
+        wp = cq.Workplane(plane_name).box(10, 10, 10)
+        with localselectors.LocalCoordinates(wp.plane):
+            await asyncio.sleep(0)
+            selector = cq.selectors.StringSyntaxSelector(">z")
+        return selector.filter(wp.faces().vals()) == wp.faces(global_selector).vals()
+
+    async def main():
+        return await asyncio.gather(
+            *[select(*args) for args in PLANES_AND_GLOBAL_SELECTORS * 5]
+        )
+
+    assert all(asyncio.run(main()))
+    assert localselectors.current_local_axes.get() is localselectors.DEFAULT_LOCAL_AXES
+
+
+@pytest.mark.parametrize(
+    "expression", [">z", "<x[-2]", ">>y[1]", "|x", "#z", "-y", "y", "not >z or %PLANE"]
+)
+def test_compiled_selector_reused_across_planes(expression):
+    """
+    Tests that a compiled selector gives the same result as the string
+    selector on every plane it is used with
+    """
+    compiled = localselectors.compile_selector(expression)
+    for plane_name in ["XY", "YZ", "ZX", "XZ", "front", "left"]:
+        wp = cq.Workplane(plane_name).box(10, 10, 10).edges(">Z").fillet(1)
+        assert wp.faces(compiled).vals() == wp.faces(expression).vals()
+        with localselectors.LocalCoordinates(wp.plane):
+            assert compiled.filter(wp.faces().vals()) == wp.faces(expression).vals()
+
+
+def test_compiled_selector_without_local_axes():
+    """
+    Tests that compiled selectors without lowercase axes are bound once
+    """
+    compiled = localselectors.CompiledSelector(">Z or |X")
+    assert not compiled.uses_local_axes
+    assert compiled.bind(cq.Plane.named("XY")) is compiled.bind(cq.Plane.named("YZ"))
+
+
+@pytest.fixture
+def holed_part():
+    return (
+        cq.Workplane("XY")
+        .box(20, 10, 6)
+        .faces(">Z")
+        .workplane()
+        .rarray(5, 4, 3, 2)
+        .hole(1.5)
+        .edges("|Z")
+        .fillet(1)
+        .faces("<Z")
+        .chamfer(0.5)
+    )
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        ">z",
+        "<x",
+        ">xy",
+        "<z[-2]",
+        ">y[1]",
+        ">>y[1]",
+        "<<z[-3]",
+        ">>x",
+        "|x",
+        "|xz",
+        "#z",
+        "+y",
+        "-y",
+        "x",
+        "-xy",
+    ],
+)
+@pytest.mark.parametrize("kind", ["faces", "edges", "vertices"])
+def test_batched_selectors_match_cadquery(holed_part, expression, kind):
+    """
+    Tests that the batched local axes selectors select the same objects
+    as the cadquery selectors
+    """
+    objs = getattr(holed_part, kind)().vals()
+    expected = cq.selectors.StringSyntaxSelector(expression.upper())
+    batched = localselectors.string_selector(expression, holed_part.plane)
+    try:
+        expected_objs = expected.filter(objs)
+    except (ValueError, IndexError) as e:
+        with pytest.raises(type(e)):
+            batched.filter(objs)
+    else:
+        assert batched.filter(objs) == expected_objs
+
+
+def test_batched_selectors_errors():
+    """
+    Tests that the batched Nth selectors raise the cadquery exceptions
+    """
+    box = cq.Workplane().box(1, 1, 1)
+    with pytest.raises(ValueError):
+        localselectors.BatchedCenterNthSelector((0, 0, 1), 0).filter([])
+    with pytest.raises(IndexError):
+        box.faces(">z[3]")
+
+
+LAZY_GRAMMAR_SCRIPT = """
+import cadquery as cq
+grammar = cq.selectors._expression_grammar
+import plugins.localselectors.localselectors as localselectors
+assert localselectors._tree_grammar is None
+box = cq.Workplane().box(1, 1, 1)
+assert len(box.faces(">Z or %PLANE exc <X").vals()) == 5
+assert localselectors._tree_grammar is None
+assert cq.selectors._expression_grammar is grammar
+assert len(box.faces(">z").vals()) == 1
+assert localselectors._tree_grammar is not None
+assert cq.selectors._expression_grammar is not grammar
+"""
+
+
+def test_grammars_built_on_first_local_selector():
+    """
+    Tests that importing the plugin does not build the grammars and that
+    they are only built when a lowercase axis is first used
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", LAZY_GRAMMAR_SCRIPT], check=True, cwd=root)
+
+
+@pytest.mark.parametrize(
+    "selector, expected",
+    [
+        (">Z", False),
+        ("%PLANE exc >X", False),
+        ("not <Y except front", False),
+        (">z", True),
+        ("|X exc #xy", True),
+        ("%cylinder", True),
+    ],
+)
+def test_may_use_local_axes(selector, expected):
+    assert localselectors._may_use_local_axes(selector) is expected
@@ -1,11 +1,22 @@
+import builtins
+import pytest
 import cadquery as cq
+from plugins.more_selectors.more_selectors import utils
 from plugins.more_selectors.more_selectors import (
+    RegionSelector,
     HollowCylinderSelector,
     InfiniteCylinderSelector,
     CylinderSelector,
     InfHollowCylinderSelector,
     SphereSelector,
     HollowSphereSelector,
+    OrientedBoxSelector,
+    SlabSelector,
+    ConeSelector,
+    UnionSelector,
+    IntersectionSelector,
+    DifferenceSelector,
+    ComplementSelector,
 )
 
 
@@ -123,3 +134,156 @@ def test_HollowSphereSelector():
     assert edges.size() == 8
     assert faces.size() == 2
     assert solids.size() == 2
+
+
+def test_CompositeSelector_operators():
+    """
+    Test that combining region selectors with the selector operators
+    builds composite selectors matching the chained cadquery selectors
+    """
+    boxes = cq.Workplane().rarray(10, 10, 4, 4).box(2, 2, 2)
+    cyl1 = CylinderSelector((-5, -5, -5), "Z", 10, 4)
+    cyl2 = CylinderSelector((5, 5, -5), "Z", 10, 4)
+    sphere = SphereSelector((0, 0, 0), 8)
+
+    union = cyl1 + cyl2
+    assert isinstance(union, UnionSelector)
+    assert isinstance(union + sphere, UnionSelector)
+    assert len((union + sphere).regions) == 3
+    assert isinstance(sphere & cyl1, IntersectionSelector)
+    assert isinstance(sphere - cyl1, DifferenceSelector)
+    assert isinstance(-sphere, ComplementSelector)
+
+    for composite, chained in [
+        (
+            cyl1 + cyl2 + sphere,
+            cq.selectors.SumSelector(cq.selectors.SumSelector(cyl1, cyl2), sphere),
+        ),
+        (sphere & cyl1, cq.selectors.AndSelector(sphere, cyl1)),
+        (sphere - cyl1, cq.selectors.SubtractSelector(sphere, cyl1)),
+        (-sphere, cq.selectors.InverseSelector(sphere)),
+    ]:
+        assert boxes.faces(composite).size() == boxes.faces(chained).size()
+        assert boxes.faces(composite).size() > 0
+
+    assert boxes.solids(cyl1 + cyl2).size() == 2
+    assert boxes.solids(UnionSelector(cyl1, cyl2, sphere)).size() == 4
+    assert boxes.solids(sphere - cyl1 - cyl2).size() == 2
+
+
+def test_RegionSelector_abstract():
+    """
+    Test that region selectors must implement mask and debug_shape
+    """
+    with pytest.raises(TypeError):
+        RegionSelector()
+
+    union = UnionSelector(SphereSelector((0, 0, 0), 1), SphereSelector((5, 0, 0), 1))
+    assert union.debug_shape(None).size() == 2
+
+
+def test_CompositeSelector_type_error():
+    """
+    Test that composite selectors only accept region selectors
+    """
+    with pytest.raises(TypeError):
+        UnionSelector(SphereSelector((0, 0, 0), 1), cq.selectors.TypeSelector("PLANE"))
+
+
+def test_OrientedBoxSelector():
+    """
+    Test that the OrientedBoxSelector selects the right number of entities
+    """
+    boxes = cq.Workplane().box(10, 10, 10).moveTo(15, 0).box(5, 5, 5)
+    vertices = boxes.vertices(
+        OrientedBoxSelector((0, 0, 0), "Z", 12, 12, 6, debug=True)
+    )
+    faces = boxes.faces(OrientedBoxSelector((0, 0, -1), "Z", 30, 1, 2))
+    rotated = boxes.vertices(
+        OrientedBoxSelector((5, 0, -6), "Z", 10.1, 1, 12, xdir=(0, 1, 0))
+    )
+    assert vertices.size() == 4
+    assert faces.size() == 3
+    assert rotated.size() == 4
+
+    # xdir is projected on the plane normal to the axis
+    tilted = boxes.vertices(
+        OrientedBoxSelector((5, 0, -6), "Z", 10.1, 1, 12, xdir=(0, 1, 1))
+    )
+    assert tilted.vals() == rotated.vals()
+
+
+def test_SlabSelector():
+    """
+    Test that the SlabSelector selects the right number of entities
+    """
+    boxes = cq.Workplane().box(10, 10, 10).moveTo(15, 0).box(5, 5, 5)
+    vertices = boxes.vertices(SlabSelector((0, 0, 0), "Z", 6, debug=True))
+    edges = boxes.edges(SlabSelector((0, 0, 4), "-Z", 8))
+    faces = boxes.faces(SlabSelector((12, 0, 0), (1, 0, 0), 10))
+    assert vertices.size() == 8
+    assert edges.size() == 16
+    assert faces.size() == 6
+
+
+def test_ConeSelector():
+    """
+    Test that the ConeSelector selects the right number of entities
+    """
+    boxes = cq.Workplane().box(10, 10, 10).moveTo(15, 0).box(5, 5, 5)
+    vertices = boxes.vertices(ConeSelector((0, 0, -6), "Z", 12, 10, debug=True))
+    inverted = boxes.vertices(ConeSelector((0, 0, -6), "Z", 12, 0, 10, debug=True))
+    faces = boxes.faces(ConeSelector((1, 0, 0), "X", 20, 6, 0.5, debug=True))
+    assert vertices.size() == 4
+    assert inverted.size() == 4
+    assert faces.size() == 3
+    assert not isinstance(ConeSelector((0, 0, 0), "Z", 1, 1), InfiniteCylinderSelector)
+
+
+@pytest.mark.parametrize(
+    "make_selector",
+    [
+        lambda: OrientedBoxSelector((0, 0, 0), "Z", 1, 0, 1),
+        lambda: OrientedBoxSelector((0, 0, 0), "Z", 1, 1, 1, xdir=(0, 0, -2)),
+        lambda: SlabSelector((0, 0, 0), "Z", -1),
+        lambda: ConeSelector((0, 0, 0), "Z", 0, 1),
+        lambda: ConeSelector((0, 0, 0), "Z", 1, -1),
+    ],
+)
+def test_region_selectors_invalid_dimensions(make_selector):
+    """
+    Test that region selectors refuse degenerated dimensions
+    """
+    with pytest.raises(ValueError):
+        make_selector()
+
+
+def test_debug_geometry_is_lazy_and_cached(monkeypatch):
+    """
+    Test that the debug geometry is only built when a viewer shows it
+    and that it is reused for identical selectors
+    """
+    boxes = cq.Workplane().box(10, 10, 10).moveTo(15, 0).box(5, 5, 5)
+    utils.make_debug_cylinder.cache_clear()
+
+    selector = InfHollowCylinderSelector((0, 0, 0), "Z", 8, 4, debug=True)
+    boxes.faces(selector)
+    assert utils.make_debug_cylinder.cache_info().currsize == 0
+
+    shown = []
+    monkeypatch.setattr(
+        builtins, "show_object", lambda obj, **kwargs: shown.append(obj), raising=False
+    )
+    for _ in range(3):
+        selector = InfHollowCylinderSelector((0, 0, 0), "Z", 8, 4, debug=True)
+        boxes.faces(selector)
+        boxes.edges(selector)
+    boxes.faces(SphereSelector((0, 0, 0), 5) + selector)
+
+    info = utils.make_debug_cylinder.cache_info()
+    assert info.misses == 1
+    assert len(shown) == 3
+    assert all(obj is shown[0] for obj in shown)
+
+    # the infinite cylinder is sized from the model instead of a fixed length
+    assert shown[0].val().BoundingBox().zlen < 100
@@ -1,3 +1,5 @@
+import math
+import numpy as np
 import pytest
 import cadquery as cq
 from plugins.teardrop import teardrop
@@ -40,3 +42,116 @@ def test_teardrop_clip_value_illegal(box, rad, clipval, reason):
         box_with_hole = (
             box.faces(">X").workplane().teardrop(rad, 0, clipval).cutThruAll()
         )
+
+
+def test_teardrop_template_cached():
+    """
+    Tests that the teardrop wire is built once for the same dimensions
+    and placed at each item on the stack
+    """
+    teardrop._teardrop_wire.cache_clear()
+    wp = cq.Workplane("XZ").rarray(10, 10, 3, 3)
+
+    first = wp.teardrop(2, 0, 2.2)
+    second = wp.teardrop(2 + 1e-12, 0, 2.2)
+    info = teardrop._teardrop_wire.cache_info()
+    assert (info.misses, info.hits) == (1, 1)
+    assert first.size() == second.size() == 9
+    assert len({w.Center().toTuple() for w in first.vals()}) == 9
+
+    wp.teardrop(2)
+    assert teardrop._teardrop_wire.cache_info().misses == 2
+
+
+def test_teardrop_template_unchanged():
+    """
+    Tests that cutting the teardrops does not modify the cached wire
+    """
+    plate = cq.Workplane("XZ").box(30, 30, 5).faces("<Y").workplane().rarray(8, 8, 3, 3)
+    for _ in range(3):
+        plate.teardrop(2).cutThruAll()
+
+    template = teardrop._teardrop_wire(2, 0, None)
+    assert [e.wrapped.TShape().Curves().Size() for e in template.Edges()] == [1, 1, 1]
+
+
+@pytest.mark.parametrize("clip", [None, 4.1])
+def test_teardrop_hole_matches_cut_thru_all(clip):
+    """
+    Tests that teardropHole makes the same holes as teardrop and cutThruAll
+    """
+    plate = (
+        cq.Workplane("XZ").box(30, 30, 8).faces("<Y").workplane().rarray(12, 12, 2, 2)
+    )
+    expected = plate.teardrop(4, 0, clip).cutThruAll()
+    result = plate.teardropHole(4, clip=clip)
+
+    assert result.val().isValid()
+    assert result.val().Volume() == pytest.approx(expected.val().Volume())
+    assert result.faces().size() == expected.faces().size()
+
+
+def _hole_vertices(wp):
+    # the vertices of the holes in the 8 x 20 x 20 box
+    return [
+        v.Center()
+        for v in wp.vertices().vals()
+        if not (
+            abs(abs(v.X) - 4) < 1e-6
+            and abs(abs(v.Y) - 10) < 1e-6
+            and abs(abs(v.Z) - 10) < 1e-6
+        )
+    ]
+
+
+@pytest.mark.parametrize("face", [">X", "<X", ">Y", "<Y"])
+def test_teardrop_hole_up(box, face):
+    """
+    Tests that the vertex of the teardrops points to the up direction
+    whatever the orientation of the workplane
+    """
+    result = box.faces(face).workplane().teardropHole(3, up=(0, 0, 1))
+    assert max(v.z for v in _hole_vertices(result)) == pytest.approx(3 * math.sqrt(2))
+
+
+def test_teardrop_hole_up_per_point(box):
+    result = (
+        box.faces(">X")
+        .workplane()
+        .pushPoints([(-5, 0), (5, 0)])
+        .teardropHole(2, depth=2, up=[(0, 0, 1), (0, 0, -1)])
+    )
+    vertices = _hole_vertices(result)
+    assert max(v.z for v in vertices if v.y < 0) == pytest.approx(2 * math.sqrt(2))
+    assert min(v.z for v in vertices if v.y > 0) == pytest.approx(-2 * math.sqrt(2))
+    assert min(v.x for v in vertices) == pytest.approx(2)
+
+
+@pytest.mark.parametrize(
+    "up",
+    [
+        cq.Vector(0, 0, 1),
+        np.array([0.0, 0.0, 1.0]),
+        (np.float64(0), np.int64(0), np.float64(1)),
+        np.array([[0.0, 0.0, 1.0], [0.0, 0.0, 1.0]]),
+        [(np.float64(0), np.float64(0), np.float64(1))] * 2,
+    ],
+)
+def test_teardrop_hole_up_types(box, up):
+    """
+    Tests the directions given as vectors, numpy arrays and numpy scalars
+    """
+    result = (
+        box.faces(">X")
+        .workplane()
+        .pushPoints([(-5, 0), (5, 0)])
+        .teardropHole(2, depth=2, up=up)
+    )
+    assert max(v.z for v in _hole_vertices(result)) == pytest.approx(2 * math.sqrt(2))
+
+
+@pytest.mark.parametrize("count", [1, 3])
+def test_teardrop_hole_up_count(box, count):
+    points = box.faces(">X").workplane().pushPoints([(-5, 0), (5, 0)])
+    with pytest.raises(ValueError, match=f"{count} directions for 2 items"):
+        points.teardropHole(2, up=[(0, 0, 1)] * count)